@@ -3,7 +3,8 @@ import json
 import sqlite3 as sql
 from miniros import AsyncROSClient, datatypes, decorators
 from miniros.util.util import Ticker
-from miniros_vslam.source.datatypes import SLAMMap, SLAMPosition
+from miniros_vslam.source.datatypes import SLAMMap, SLAMMapDelta, SLAMPosition
+from miniros_vslam.source.mapdelta import MapAssembler
 from miniros_ssmain.source.datatypes import Task as TaskDatatype
 import http.server as http
 import asyncio
@@ -94,6 +95,7 @@ class SSMainClient(AsyncROSClient):
         super().__init__("ssmain", ip, port)
 
         self.robots: dict[str, Robot] = {}
+        self.map_assemblers: dict[str, MapAssembler] = {}
 
     @decorators.parsedata(SLAMMap, 1)
     async def on_map(self, data: SLAMMap, from_node: str):
@@ -107,6 +109,24 @@ class SSMainClient(AsyncROSClient):
         else:
             self.robots[from_node].map = data
 
+    @decorators.parsedata(SLAMMapDelta, 1)
+    async def on_mapdelta(self, data: SLAMMapDelta, from_node: str):
+        assembler = self.map_assemblers.setdefault(from_node, MapAssembler())
+        if assembler.apply(data) is None:
+            return # waiting for a keyframe
+
+        map = SLAMMap(assembler.map.reshape(-1).data) # view of the assembled map, no copy
+
+        if from_node not in self.robots:
+            self.robots[from_node] = Robot(
+                None,
+                map,
+                None
+            )
+
+        else:
+            self.robots[from_node].map = map
+
     @decorators.parsedata(SLAMPosition, 1)
     async def on_pos(self, data: SLAMPosition, from_node: str):
         if from_node not in self.robots:
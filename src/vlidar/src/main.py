@@ -1,18 +1,54 @@
 from miniros import AsyncROSClient
 from miniros.util.decorators import decorators
 from miniros_vlidar.source.datatypes import LidarData
+from miniros_vlidar.source.acquisition import ScanReader
+from miniros_vlidar.source.resample import ScanResampler
+from miniros_vlidar.source.supervisor import LidarSupervisor
 import adafruit_rplidar as pyrplidar
 import asyncio
+import time
+
+
+STATS_INTERVAL = 10 # s between stats lines in the log
 
 
 class VLidarClient(AsyncROSClient):
-    def __init__(self, ip = "localhost", port = 3000):
+    def __init__(self, ip = "localhost", port = 3000, buffer_scans = 4, drop = "oldest", bins = 360,
+                 lidar_port = "/dev/ttyUSB0", baudrate = 115200, lidar_factory = None):
         super().__init__("vlidar", ip, port)
 
-        self.lidar = pyrplidar.RPLidar(None, "/dev/ttyUSB0", baudrate=115200)
-        self.lidar.connect()
-        
-        self.lidar.stop_motor()
+        # scans are read in a thread, drop says which scan to lose when SLAM falls behind
+        self.reader = ScanReader(buffer_scans, drop)
+
+        # scans are published resampled to fixed angle bins, None publishes raw points
+        self.resampler = ScanResampler(bins) if bins else None
+
+        # lidar_factory opens the lidar (e.g. a FakeRPLidar for running without hardware)
+        if lidar_factory is None:
+            lidar_factory = lambda: pyrplidar.RPLidar(None, lidar_port, baudrate=baudrate)
+        self.supervisor = LidarSupervisor(lidar_factory, self.reader)
+
+        self.stats_time = time.monotonic()
+        self.stats_last = self.reader.stats()
+
+    def log_stats(self):
+        """Prints scan rate, points per scan and dropped scans since the previous call, reconnects and downtime in total"""
+
+        now = time.monotonic()
+        stats = self.reader.stats()
+        supervisor = self.supervisor.stats()
+        scans = stats["received"] - self.stats_last["received"]
+        points = stats["points"] - self.stats_last["points"]
+
+        print(
+            f"{scans / (now - self.stats_time):.1f} scans/s, "
+            f"{points / scans if scans else 0:.0f} points/scan, "
+            f"{stats['dropped'] - self.stats_last['dropped']} dropped, "
+            f"{supervisor['reconnects']} reconnects, {supervisor['downtime']:.1f} s down in total"
+            + (f", lidar down ({supervisor['last_error']!r})" if supervisor["down"] else "")
+        )
+
+        self.stats_time, self.stats_last = now, stats
 
 
 async def main():
@@ -23,41 +59,34 @@ async def main():
 
         ldr_topic = await client.topic("lidar", LidarData)
 
-        client.lidar.start_motor()
-
         while True:
+            # lidar failures are handled (and waited out) by the supervisor
+            scan = await client.supervisor.get()
+
             try:
-                for scan in client.lidar.iter_scans():
-                    quality, angles, distances = zip(*scan)
-
-                    print(angles, distances)
-
-                    await ldr_topic.post(
-                        LidarData(
-                            distances,
-                            angles,
-                        )
-                    )
-
-            except pyrplidar.RPLidarException as e:
-                print(f"Lidar exception: {e}. Reconnecting...")
-                
-                client.lidar.stop()
-                client.lidar.disconnect()
-
-                await asyncio.sleep(0.4)
-                
-                client.lidar = pyrplidar.RPLidar(None, "/dev/ttyUSB0")
-                
+                if client.resampler is not None:
+                    scan = client.resampler.apply(scan)
+                    if scan is None: # lidar covered or blinded, nothing SLAM could use
+                        continue
+
+                await ldr_topic.post(scan)
+
             except Exception as e:
                 print(f"Unexpected error: {e}")
-                
-                await asyncio.sleep(0.2)
-                
-                
+
+    async def log_stats():
+        # separate from run(), which waits for scans: stats matter most while the lidar is down
+        await client.wait()
+
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            client.log_stats()
+
+
     await asyncio.gather(
         client.run(),
         run(),
+        log_stats(),
     )
 
 
@@ -0,0 +1,153 @@
+import asyncio
+import collections
+import threading
+import time
+import numpy as np
+from miniros_vlidar.source.datatypes import LidarData
+
+
+class ScanReader:
+    """
+    Reads lidar scans in a background thread into a bounded ring buffer
+
+    The serial reads block, so they run off the event loop; coroutines take
+    scans with `get`. When the consumer falls behind, the buffer drops either
+    the oldest scan (SLAM always gets the freshest data) or the incoming one.
+    An exception of the reader thread is raised from the next `get`, after
+    the scans read before it.
+
+    Scans are assembled from `lidar.iter_measurements()` straight into arrays
+    and buffered as `LidarData`, numbered in read order (dropped scans leave
+    gaps) and stamped with `time.monotonic()` of their first and last point.
+
+    :param maxlen: scans kept in the buffer
+    :param drop: "oldest" or "newest", which scan is dropped when the buffer is full
+    :param min_points: scans with fewer valid points are discarded
+    """
+
+    def __init__(self, maxlen: int = 4, drop: str = "oldest", min_points: int = 5):
+        if drop not in ("oldest", "newest"):
+            raise ValueError(f"Unknown drop policy {drop!r}")
+
+        self.maxlen = maxlen
+        self.drop = drop
+        self.min_points = min_points
+
+        self.buffer = collections.deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.event = asyncio.Event()
+        self.loop = None
+        self.thread = None
+
+        self.error = None
+        self.generation = 0 # bumped by start/stop, so a thread left blocked on an old lidar gets ignored
+
+        self.received = 0 # also the sequence number of the next scan
+        self.dropped = 0
+        self.points = 0 # valid points in received scans
+
+    def start(self, lidar):
+        """Starts reading lidar.iter_measurements(), must be called from the event loop"""
+
+        self.loop = asyncio.get_running_loop()
+        with self.lock:
+            self.generation += 1
+            self.error = None
+            generation = self.generation
+
+        self.thread = threading.Thread(target=self._read, args=(lidar, generation), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Detaches the reader thread, which exits once its blocking read returns"""
+
+        with self.lock:
+            self.generation += 1
+
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"received": self.received, "dropped": self.dropped, "points": self.points}
+
+    def _read(self, lidar, generation: int):
+        try:
+            # a list per field, converted once per scan, is cheaper than collecting
+            # (quality, angle, distance) tuples and unzipping them
+            quality, angles, distances = [], [], []
+            t_start = t_end = None
+
+            for new_scan, q, angle, distance in lidar.iter_measurements():
+                now = time.monotonic()
+
+                if new_scan:
+                    # the points before the first scan start are a partial scan
+                    if t_start is not None and len(distances) >= self.min_points and not self._push(generation, quality, angles, distances, t_start, t_end):
+                        return
+
+                    quality, angles, distances = [], [], []
+                    t_start = now
+
+                if q > 0 and distance > 0:
+                    quality.append(q)
+                    angles.append(angle)
+                    distances.append(distance)
+                    t_end = now
+
+        except Exception as e:
+            with self.lock:
+                if generation != self.generation:
+                    return
+                self.error = e
+
+            self._wake()
+
+    def _push(self, generation: int, quality, angles, distances, t_start: float, t_end: float) -> bool:
+        """Buffers a finished scan, returns False if this reader thread was detached"""
+
+        with self.lock:
+            if generation != self.generation:
+                return False
+
+            seq = self.received
+            self.received += 1
+            self.points += len(distances)
+            if len(self.buffer) == self.maxlen:
+                self.dropped += 1
+                if self.drop == "newest":
+                    return True
+
+            self.buffer.append(LidarData( # drops the oldest scan when full
+                np.array(distances, dtype=np.float32),
+                np.array(angles, dtype=np.float32),
+                np.array(quality, dtype=np.uint8),
+                seq,
+                t_start,
+                t_end,
+            ))
+
+        self._wake()
+        return True
+
+    def _wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError: # event loop closed
+            pass
+
+    async def get(self) -> LidarData:
+        """Waits for the oldest buffered scan"""
+
+        while True:
+            self.event.clear()
+
+            with self.lock:
+                if self.buffer:
+                    return self.buffer.popleft()
+
+                if self.error is not None:
+                    error, self.error = self.error, None
+                    raise error
+
+            await self.event.wait()
@@ -1,26 +1,105 @@
-from miniros.util.datatypes import NumpyArray
+from miniros.util.datatypes import Datatype
 import numpy as np
+import struct
 
-class LidarData(NumpyArray):
-    def __init__(self, distances: list[int] | np.ndarray[np.uint], angles: list[int] | np.ndarray[np.uint]): 
+class LidarData(Datatype):
+    """
+    Lidar scan
+
+    Packed as a header followed by uint16 distances (mm), uint16 fixed-point
+    angles (65536 per turn) and, if flagged, uint8 qualities. Decoded arrays
+    are views of the message.
+
+    Binned scans (see `resample.ScanResampler`) have point k at k * 360 / n
+    degrees, so only their distances are sent.
+
+    :param distances: distances, mm
+    :param angles: angles, degrees
+    :param quality: per point quality, None if unknown
+    :param seq: scan sequence number, gaps mean dropped scans
+    :param t_start: time of the first point, s (time.monotonic of the lidar host)
+    :param t_end: time of the last point, s
+    """
+
+    HEADER = struct.Struct("<IHBxdd") # seq, point count, flags, pad, t_start, t_end
+    FLAG_QUALITY = 1
+    FLAG_BINNED = 2
+
+    ANGLE_SCALE = 65536 / 360 # fixed-point units per degree
+
+    def __init__(self, distances: list[int] | np.ndarray[np.uint], angles: list[int] | np.ndarray[np.uint] | None,
+                 quality: np.ndarray | None = None, seq: int = 0, t_start: float = 0, t_end: float = 0):
+        super().__init__()
         self.distances = np.asarray(distances)
-        self.angles = np.asarray(angles)
+        self._angles = None if angles is None else np.asarray(angles)
+        self.angles_fixed = None # raw fixed-point angles when decoded
+        self.quality = quality
+        self.seq = seq
+        self.t_start = t_start
+        self.t_end = t_end
+        self.binned = False
+
+    @staticmethod
+    def from_bins(distances: np.ndarray, seq: int = 0, t_start: float = 0, t_end: float = 0) -> "LidarData":
+        """Scan of distances at evenly spaced angles, the first one at 0 degrees"""
+
+        scan = LidarData(distances, None, None, seq, t_start, t_end)
+        scan.binned = True
+        return scan
+
+    @property
+    def angles(self) -> np.ndarray:
+        if self._angles is None:
+            if self.binned:
+                self._angles = np.arange(len(self.distances)) * (360 / len(self.distances))
+            elif self.angles_fixed is not None:
+                self._angles = self.angles_fixed / LidarData.ANGLE_SCALE
+        return self._angles
+
+    @angles.setter
+    def angles(self, angles):
+        self._angles = np.asarray(angles)
+        self.angles_fixed = None
+        self.binned = False
 
     @staticmethod
     def encode(data: "LidarData"):
-        data = np.asarray(
-            [
-                data.distances,
-                data.angles
-            ]
-        )
-        return super().encode(data)
-    
+        count = len(data.distances)
+        flags = (LidarData.FLAG_QUALITY if data.quality is not None else 0) | \
+            (LidarData.FLAG_BINNED if data.binned else 0)
+
+        parts = [
+            LidarData.HEADER.pack(data.seq, count, flags, data.t_start, data.t_end),
+            np.clip(np.rint(data.distances), 0, 0xFFFF).astype("<u2").tobytes(),
+        ]
+
+        if not data.binned:
+            if data.angles_fixed is not None:
+                angles = data.angles_fixed
+            else:
+                angles = np.rint(np.mod(data.angles, 360) * LidarData.ANGLE_SCALE).astype(np.uint32) & 0xFFFF
+            parts.append(np.asarray(angles, dtype="<u2").tobytes())
+
+        if data.quality is not None:
+            parts.append(np.asarray(data.quality, dtype=np.uint8).tobytes())
+        return b"".join(parts)
+
     @staticmethod
-    def decode(data: "LidarData"):
-        data = super().decode(data)
+    def decode(data: bytearray) -> "LidarData":
+        seq, count, flags, t_start, t_end = LidarData.HEADER.unpack_from(data)
+        offset = LidarData.HEADER.size
+
+        distances = np.frombuffer(data, dtype="<u2", count=count, offset=offset)
+        offset += 2 * count
+
+        if flags & LidarData.FLAG_BINNED:
+            scan = LidarData.from_bins(distances, seq, t_start, t_end)
+        else:
+            scan = LidarData(distances, None, None, seq, t_start, t_end)
+            scan.angles_fixed = np.frombuffer(data, dtype="<u2", count=count, offset=offset)
+            offset += 2 * count
+
+        if flags & LidarData.FLAG_QUALITY:
+            scan.quality = np.frombuffer(data, dtype=np.uint8, count=count, offset=offset)
 
-        return LidarData(
-            data[0],
-            data[1],
-        )
+        return scan
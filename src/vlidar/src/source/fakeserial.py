@@ -0,0 +1,139 @@
+import time
+import adafruit_rplidar as pyrplidar
+import serial
+
+
+# replies of an RPLidar to the health request ("Good") and to the scan request
+HEALTH_REPLY = b"\xa5\x5a\x03\x00\x00\x00\x06" + b"\x00\x00\x00"
+SCAN_DESCRIPTOR = b"\xa5\x5a\x05\x00\x00\x40\x81"
+
+
+class FakeSerial:
+    """
+    Serial port replaying a recorded byte stream, for running the lidar stack without hardware
+
+    Reads return the stream in order whatever was written; once it runs out
+    they return short, like a port timing out on a silent device. With
+    fail_after set, reads past that many bytes raise SerialException, like
+    an unplugged USB adapter.
+
+    :param data: bytes the device sends (see `SerialRecorder`, `scan_stream`)
+    :param fail_after: bytes read before the port fails, None to never fail
+    :param timeout: seconds a read waits when the stream has run out
+    """
+
+    def __init__(self, data: bytes, fail_after: int | None = None, timeout: float = 0):
+        self.data = memoryview(bytes(data))
+        self.offset = 0
+        self.fail_after = fail_after
+        self.timeout = timeout
+
+        self.written = [] # commands sent to the device
+        self.flushes = 0
+        self.dtr = True
+        self.is_open = True
+
+    @staticmethod
+    def from_file(path: str, **kwargs) -> "FakeSerial":
+        with open(path, "rb") as f:
+            return FakeSerial(f.read(), **kwargs)
+
+    @property
+    def in_waiting(self) -> int:
+        return 0 # bytes come as fast as they are read, nothing queues up
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+
+        if self.fail_after is not None and self.offset + size > self.fail_after:
+            self.offset = self.fail_after
+            raise serial.SerialException("Fake device disconnected")
+
+        chunk = bytes(self.data[self.offset:self.offset + size])
+        self.offset += len(chunk)
+
+        if len(chunk) < size and self.timeout:
+            time.sleep(self.timeout)
+        return chunk
+
+    def write(self, data: bytes) -> int:
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+
+        self.written.append(bytes(data))
+        return len(data)
+
+    def flushInput(self):
+        self.flushes += 1 # the recorded stream only holds bytes that were read, nothing to discard
+
+    reset_input_buffer = flushInput
+
+    def close(self):
+        self.is_open = False
+
+
+class SerialRecorder:
+    """
+    Wraps a serial port, appending every byte read from it to a file for `FakeSerial`
+
+        lidar._serial_port = SerialRecorder(lidar._serial_port, "lidar.bin")
+    """
+
+    def __init__(self, port, path: str):
+        self.port = port
+        self.file = open(path, "ab")
+
+    def read(self, size: int = 1) -> bytes:
+        data = self.port.read(size)
+        self.file.write(data)
+        return data
+
+    def close(self):
+        self.file.close()
+        self.port.close()
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+    def __setattr__(self, name, value):
+        if name in ("port", "file"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self.port, name, value)
+
+
+def scan_stream(scans) -> bytes:
+    """
+    Bytes an RPLidar sends for a health check and a normal scan of the given scans
+
+    :param scans: iterable of (angles deg, distances mm, qualities) sequences, one per turn
+    """
+    parts = [HEALTH_REPLY, SCAN_DESCRIPTOR]
+
+    for angles, distances, qualities in scans:
+        for k, (angle, distance, quality) in enumerate(zip(angles, distances, qualities)):
+            start = k == 0
+            angle_q6 = int(angle * 64) & 0x7FFF
+            distance_q2 = min(int(distance * 4), 0xFFFF)
+
+            parts.append(bytes((
+                (int(quality) & 0x3F) << 2 | (0b01 if start else 0b10),
+                (angle_q6 & 0x7F) << 1 | 1,
+                angle_q6 >> 7,
+                distance_q2 & 0xFF,
+                distance_q2 >> 8,
+            )))
+
+    return b"".join(parts)
+
+
+class FakeRPLidar(pyrplidar.RPLidar):
+    """RPLidar driver talking to a `FakeSerial` (or any object with the pyserial interface)"""
+
+    def __init__(self, port, **kwargs):
+        self.fake_port = port
+        super().__init__(None, "fake", **kwargs)
+
+    def connect(self):
+        self._serial_port = self.fake_port
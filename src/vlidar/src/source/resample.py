@@ -0,0 +1,70 @@
+import numpy as np
+from miniros_vlidar.source.datatypes import LidarData
+
+
+class ScanResampler:
+    """
+    Resamples lidar scans to a fixed number of evenly spaced angle bins
+
+    Bin k holds the mean of the points within half a bin of k * 360 / bins
+    degrees. Points outside [min_distance, max_distance] are dropped. With
+    outlier_mm set, so are bins made of a single point further than
+    outlier_mm from both neighbouring bins (edge ghosts, dust); this also
+    removes thin real obstacles, so it is off by default. Empty bins are
+    interpolated from the nearest filled ones around the circle, the way
+    breezyslam interpolates raw scans.
+
+    With bins equal to the SLAM laser scan size, SLAM can take the
+    distances as they are, without its per-scan sort and interpolation.
+
+    :param bins: bins per turn
+    :param min_distance_mm: closer points are dropped (robot body, lidar blind zone)
+    :param max_distance_mm: further points are dropped
+    :param outlier_mm: distance to both neighbours making a lone point an outlier, 0 to keep all
+    """
+
+    def __init__(self, bins: int = 360, min_distance_mm: float = 150, max_distance_mm: float = 12000, outlier_mm: float = 0):
+        self.bins = bins
+        self.min_distance_mm = min_distance_mm
+        self.max_distance_mm = max_distance_mm
+        self.outlier_mm = outlier_mm
+
+        self.index = np.arange(bins)
+
+    def resample(self, distances: np.ndarray, angles: np.ndarray) -> np.ndarray | None:
+        """
+        Distances (mm) of the bins as float32, None if the scan has less than two usable points
+
+        A scan of zeros must not be passed on instead: SLAM takes 0 as no
+        return and would clear the map around the robot out to full range
+        """
+
+        distances = np.asarray(distances, dtype=np.float64)
+        valid = (distances >= self.min_distance_mm) & (distances <= self.max_distance_mm)
+        distances = distances[valid]
+
+        bin = np.rint(np.asarray(angles)[valid] * (self.bins / 360)).astype(np.int64) % self.bins
+        counts = np.bincount(bin, minlength=self.bins)
+        sums = np.bincount(bin, weights=distances, minlength=self.bins)
+
+        filled = counts > 0
+        binned = np.divide(sums, counts, out=np.zeros(self.bins), where=filled)
+
+        if self.outlier_mm:
+            left, right = np.roll(binned, 1), np.roll(binned, -1)
+            outlier = (counts == 1) & np.roll(filled, 1) & np.roll(filled, -1) & \
+                (np.abs(binned - left) > self.outlier_mm) & (np.abs(binned - right) > self.outlier_mm)
+            filled &= ~outlier
+
+        if np.count_nonzero(filled) < 2:
+            return None
+
+        return np.interp(self.index, self.index[filled], binned[filled], period=self.bins).astype(np.float32)
+
+    def apply(self, scan: LidarData) -> LidarData | None:
+        """Binned copy of scan, keeping its sequence number and timestamps, None if it has too few usable points"""
+
+        distances = self.resample(scan.distances, scan.angles)
+        if distances is None:
+            return None
+        return LidarData.from_bins(distances, scan.seq, scan.t_start, scan.t_end)
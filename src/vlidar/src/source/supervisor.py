@@ -0,0 +1,132 @@
+import asyncio
+import time
+from miniros_vlidar.source.acquisition import ScanReader
+from miniros_vlidar.source.datatypes import LidarData
+
+
+class LidarSupervisor:
+    """
+    Keeps a lidar connected and scanning
+
+    Any error of the lidar or its reader thread, or no scan within
+    scan_timeout, tears the connection down (reader detached, scanning and
+    motor stopped, port closed) and reconnects after an exponentially growing
+    pause. Reconnecting opens a new lidar from the factory, stops any scan a
+    previous session left running, restarts the motor and flushes the bytes
+    received while it spun up. The pause drops back to backoff_min once a
+    scan arrives.
+
+    Downtime is counted from a failure to the first scan after it.
+
+    :param factory: opens a lidar, e.g. `lambda: RPLidar(None, port, baudrate=115200)`
+    :param reader: reader thread to feed from the lidar
+    :param backoff_min: first pause before reconnecting, s
+    :param backoff_max: longest pause, s
+    :param scan_timeout: s without a scan that count as a failure
+    :param spinup: s for the motor to reach speed before scanning
+    """
+
+    def __init__(self, factory, reader: ScanReader, backoff_min: float = 0.2, backoff_max: float = 10,
+                 scan_timeout: float = 3, spinup: float = 0.5):
+        self.factory = factory
+        self.reader = reader
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.scan_timeout = scan_timeout
+        self.spinup = spinup
+
+        self.lidar = None
+        self.backoff = backoff_min
+
+        self.failures = 0
+        self.reconnects = 0 # connections opened after a failure
+        self.downtime = 0. # s, finished outages
+        self.outages = 0
+        self.down_since = None
+        self.last_error = None
+
+    async def get(self) -> LidarData:
+        """Next scan, reconnecting as long as it takes"""
+
+        while True:
+            if self.lidar is None:
+                await self._connect()
+
+            try:
+                scan = await asyncio.wait_for(self.reader.get(), self.scan_timeout)
+            except Exception as e:
+                await self._fail(e)
+                continue
+
+            if self.down_since is not None:
+                self.downtime += time.monotonic() - self.down_since
+                self.outages += 1
+                self.down_since = None
+            self.backoff = self.backoff_min
+
+            return scan
+
+    async def _connect(self):
+        while self.lidar is None:
+            try:
+                self.lidar = await asyncio.to_thread(self._open)
+            except Exception as e:
+                await self._fail(e)
+                continue
+
+            if self.failures:
+                self.reconnects += 1
+            self.reader.start(self.lidar)
+
+    def _open(self):
+        lidar = self.factory()
+        try:
+            lidar.stop() # also flushes the input
+            lidar.start_motor()
+            time.sleep(self.spinup)
+            lidar.clear_input()
+        except Exception:
+            self._close(lidar)
+            raise
+
+        return lidar
+
+    @staticmethod
+    def _close(lidar):
+        for step in (lidar.stop, lidar.stop_motor, lidar.disconnect):
+            try:
+                step()
+            except Exception: # the link is likely gone already
+                pass
+
+    async def _fail(self, error: Exception):
+        self.failures += 1
+        self.last_error = error
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+
+        print(f"Lidar error: {error!r}. Reconnecting in {self.backoff:.1f} s")
+
+        self.reader.stop()
+        if self.lidar is not None:
+            lidar, self.lidar = self.lidar, None
+            await asyncio.to_thread(self._close, lidar)
+
+        await asyncio.sleep(self.backoff)
+        self.backoff = min(self.backoff * 2, self.backoff_max)
+
+    def stats(self) -> dict:
+        """Failures, reconnects and downtime (s, including the ongoing outage)"""
+
+        downtime = self.downtime
+        if self.down_since is not None:
+            downtime += time.monotonic() - self.down_since
+
+        return {
+            "failures": self.failures,
+            "reconnects": self.reconnects,
+            "outages": self.outages,
+            "downtime": downtime,
+            "down": self.down_since is not None,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,86 @@
+import asyncio
+import numpy as np
+import serial
+from miniros_vlidar.source.acquisition import ScanReader
+from miniros_vlidar.source.fakeserial import FakeRPLidar, FakeSerial, scan_stream
+from miniros_vlidar.source.supervisor import LidarSupervisor
+
+
+START_MOTOR = b"\xa5\xf0\x02\x94\x02\xc1" # set PWM 660
+
+
+def make_stream(scans: int = 20) -> bytes:
+    angles = np.arange(0, 360, 1.0)
+    return scan_stream((angles, np.full(360, 1000 + k), np.full(360, 15)) for k in range(scans))
+
+
+class Factory:
+    """Opens a FakeRPLidar per call, failing as scripted: None opens fine, "open" fails to open, N disconnects after N bytes"""
+
+    def __init__(self, script, data: bytes):
+        self.script = list(script)
+        self.data = data
+        self.ports = []
+
+    def __call__(self):
+        step = self.script.pop(0) if self.script else None
+        if step == "open":
+            raise serial.SerialException("Fake device not found")
+
+        port = FakeSerial(self.data, fail_after=step)
+        self.ports.append(port)
+        return FakeRPLidar(port)
+
+
+def supervise(factory, scans: int, **kwargs):
+    async def run():
+        supervisor = LidarSupervisor(factory, ScanReader(4, "newest"), spinup=0, scan_timeout=1, **kwargs)
+        got = [await supervisor.get() for _ in range(scans)]
+        return supervisor, got
+
+    return asyncio.run(run())
+
+
+def test_scans_without_failures():
+    factory = Factory([], make_stream())
+    supervisor, scans = supervise(factory, 5)
+
+    assert [scan.seq for scan in scans] == [0, 1, 2, 3, 4]
+    assert len(scans[0].distances) == 360
+    assert supervisor.stats()["failures"] == 0
+    assert len(factory.ports) == 1
+
+
+def test_disconnect_backoff_reconnect():
+    # the first session disconnects a few scans in, the next open fails, the one after works
+    data = make_stream()
+    factory = Factory([len(data) // 4, "open", None], data)
+    supervisor, scans = supervise(factory, 10, backoff_min=0.05, backoff_max=1)
+
+    stats = supervisor.stats()
+    assert len(scans) == 10
+    assert stats["failures"] == 2
+    assert stats["reconnects"] == 1
+    assert stats["outages"] == 1
+    assert not stats["down"]
+    assert stats["downtime"] >= 0.05 + 0.1 # both backoffs, the second one doubled
+    assert isinstance(stats["last_error"], serial.SerialException)
+
+    # backoff is back to the minimum once scans arrive
+    assert supervisor.backoff == 0.05
+
+    # the old port is closed, the new one had its motor restarted and input flushed
+    old, new = factory.ports
+    assert not old.is_open
+    assert START_MOTOR in new.written
+    assert new.flushes > 0
+
+
+def test_backoff_capped():
+    data = make_stream()
+    factory = Factory(["open"] * 4, data)
+    supervisor, _ = supervise(factory, 1, backoff_min=0.01, backoff_max=0.04)
+
+    assert supervisor.stats()["failures"] == 4
+    assert supervisor.backoff == 0.01
+    assert supervisor.downtime >= 0.01 + 0.02 + 0.04 + 0.04
@@ -1,9 +1,14 @@
 from miniros import AsyncROSClient
 from miniros.util.datatypes import Vector
 from miniros.util.decorators import decorators
+from miniros.util.util import Ticker
 from miniros_vslam.source.datatypes import SLAMPosition
+from miniros_vmovement.source.datatypes import TrackSpeeds
 import asyncio
 
+
+TRACKS_RATE = 4 # Hz, held nonzero track speeds are reposted so vslam knows its odometry is current
+
 class VMovementClient(AsyncROSClient):
     def __init__(self, ip = "localhost", port = 3000):
         super().__init__("vmovement", ip, port)
@@ -14,6 +19,9 @@ class VMovementClient(AsyncROSClient):
         self.m_target = None
         self.m_moving = False
 
+        self.tracks = TrackSpeeds(0, 0) # last commanded track speeds, RPM
+        self.tracks_topic = None
+
     @decorators.aparsedata(Vector, 1)
     async def on_moveto(self, data: Vector, node: str):
         if data.y == 1:
@@ -21,6 +29,7 @@ class VMovementClient(AsyncROSClient):
             self.m_target = None
             
             # TODO: Stop
+            await self.set_tracks(0, 0)
 
         else:
             self.m_target = (data.x, data.z)
@@ -31,6 +40,20 @@ class VMovementClient(AsyncROSClient):
         self.s_pos = (data.pos.x, data.pos.z)
         self.s_rot = data.ang.y
 
+    async def set_tracks(self, left: float, right: float):
+        """
+        Commands track speeds and posts them as odometry for vslam
+
+        Only speeds actually sent to the motors may go through here, vslam trusts them as odometry
+
+        :param left: left track speed, RPM
+        :param right: right track speed, RPM
+        """
+        self.tracks = TrackSpeeds(left, right)
+
+        if self.tracks_topic is not None:
+            await self.tracks_topic.post(self.tracks)
+
     @staticmethod
     def _calculate_motors_speed(go_from: tuple[float, float], go_to: tuple[float, float]):
         # TODO: algos
@@ -39,7 +62,26 @@ class VMovementClient(AsyncROSClient):
 
 async def main():
     client = VMovementClient()
-    await client.run()
+
+    async def run():
+        await client.wait()
+
+        client.tracks_topic = await client.topic("tracks", TrackSpeeds)
+
+        ticker = Ticker(TRACKS_RATE)
+
+        while True:
+            await ticker.tick_async()
+
+            # a held stop is not reposted: standing still is posted once by set_tracks, and
+            # while the motors are driven by something else vslam must not keep trusting zeros
+            if client.tracks.left or client.tracks.right:
+                await client.tracks_topic.post(client.tracks)
+
+    await asyncio.gather(
+        client.run(),
+        run(),
+    )
 
 
 if __name__ == "__main__":
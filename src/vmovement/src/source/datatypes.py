@@ -0,0 +1,25 @@
+from miniros.util.datatypes import Datatype
+import struct
+
+class TrackSpeeds(Datatype):
+    """
+    Track speeds, commanded or measured
+
+    :param left: left track drive wheel speed, RPM
+    :param right: right track drive wheel speed, RPM
+    """
+
+    STRUCT = struct.Struct("<dd")
+
+    def __init__(self, left: float, right: float):
+        super().__init__()
+        self.left = left
+        self.right = right
+
+    @staticmethod
+    def encode(data: "TrackSpeeds"):
+        return TrackSpeeds.STRUCT.pack(data.left, data.right)
+
+    @staticmethod
+    def decode(data: bytearray) -> "TrackSpeeds":
+        return TrackSpeeds(*TrackSpeeds.STRUCT.unpack_from(data))
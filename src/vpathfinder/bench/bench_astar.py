@@ -0,0 +1,49 @@
+import argparse
+import time
+import numpy as np
+import miniros_vpathfinder.source.algorithms as algos
+from warehouse import warehouse_grid, free_corners
+
+
+def path_cost(path) -> float:
+    steps = np.abs(np.diff(np.asarray(path), axis=0))
+    return float(np.sum(np.where(steps.sum(axis=1) == 2, algos.SQRT2, 1.0)))
+
+
+def run(planner, grid, start, goal, repeat: int):
+    best = float("inf")
+    path = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        path = planner(grid, start, goal)
+        best = min(best, time.perf_counter() - t)
+    return best, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare astar planners on synthetic warehouse grids")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400, 800])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-dict", action="store_true", help="do not run the dict-based astar")
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'engine':>12} {'time, s':>10} {'length':>8} {'cost':>10}")
+
+    for size in args.sizes:
+        grid = warehouse_grid(size)
+        start, goal = free_corners(grid)
+
+        engines = [("astar_flat", algos.astar_flat), ("hierarchical", algos.hierarchical_astar)]
+        if not args.skip_dict:
+            engines.insert(0, ("astar", algos.astar))
+
+        for name, planner in engines:
+            elapsed, path = run(planner, grid, start, goal, args.repeat)
+            if path is None:
+                print(f"{size:>6} {name:>12} {elapsed:>10.4f} {'-':>8} {'-':>10}")
+            else:
+                print(f"{size:>6} {name:>12} {elapsed:>10.4f} {len(path):>8} {path_cost(path):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
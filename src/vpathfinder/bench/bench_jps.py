@@ -0,0 +1,34 @@
+import argparse
+import miniros_vpathfinder.source.algorithms as algos
+from warehouse import warehouse_grid, free_corners
+from bench_astar import run, path_cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare jps with astar on aisle-like warehouse grids")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400, 800])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pallets", action="store_true", help="scatter single-cell obstacles in the aisles")
+    parser.add_argument("--skip-dict", action="store_true", help="do not run the dict-based astar")
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'engine':>10} {'time, s':>10} {'length':>8} {'cost':>10}")
+
+    for size in args.sizes:
+        grid = warehouse_grid(size, seed=0 if args.pallets else None)
+        start, goal = free_corners(grid)
+
+        engines = [("astar_flat", algos.astar_flat), ("jps", algos.jps)]
+        if not args.skip_dict:
+            engines.insert(0, ("astar", algos.astar))
+
+        for name, planner in engines:
+            elapsed, path = run(planner, grid, start, goal, args.repeat)
+            if path is None:
+                print(f"{size:>6} {name:>10} {elapsed:>10.4f} {'-':>8} {'-':>10}")
+            else:
+                print(f"{size:>6} {name:>10} {elapsed:>10.4f} {len(path):>8} {path_cost(path):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import time
+import numpy as np
+import miniros_vpathfinder.source.algorithms as algos
+from miniros_vpathfinder.source.costmap import Costmap
+from warehouse import warehouse_grid
+
+
+def wavy_path(points: int, size: int) -> np.ndarray:
+    t = np.linspace(0, 1, points)
+    rows = size * (0.1 + 0.8 * t)
+    cols = size * (0.5 + 0.3 * np.sin(6 * np.pi * t))
+    return np.stack([rows, cols], axis=1)
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare smooth_path and smooth_path_vectorized")
+    parser.add_argument("--points", type=int, nargs="+", default=[100, 500, 1000, 5000])
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    grid = warehouse_grid(args.size)
+    obstacles = grid == 0
+
+    costmap = Costmap(obstacle_threshold=1)
+    costmap.update(grid, 0)
+    costmap.gradient()
+
+    print(f"{'points':>7} {'smooth_path':>12} {'+costmap':>10} {'vectorized':>11} {'speedup':>8}")
+
+    for points in args.points:
+        path = wavy_path(points, args.size)
+
+        loop = timed(lambda: algos.smooth_path(path.astype(np.int64), obstacles, iterations=args.iterations), args.repeat)
+        lookup = timed(lambda: algos.smooth_path(path.astype(np.int64), obstacles, iterations=args.iterations,
+                                                 costmap=costmap), args.repeat)
+        vectorized = timed(lambda: algos.smooth_path_vectorized(path, costmap, iterations=args.iterations,
+                                                                tolerance=0), args.repeat)
+
+        print(f"{points:>7} {loop:>12.4f} {lookup:>10.4f} {vectorized:>11.5f} {loop / vectorized:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def warehouse_grid(size: int, shelf_width: int = 4, aisle_width: int = 6, block_length: int = 40,
+                   cross_aisle: int = 8, wall: int = 2, seed: int | None = 0) -> np.ndarray:
+    """
+    Synthetic warehouse occupancy grid: rows of shelving split by cross aisles
+
+    Returns a grid in `astar` convention (nonzero cells are traversable)
+
+    :param size: side of the square grid, px
+    :param shelf_width: thickness of a shelf row, px
+    :param aisle_width: width of the aisle between shelf rows, px
+    :param block_length: length of a shelf block between cross aisles, px
+    :param cross_aisle: width of cross aisles, px
+    :param wall: thickness of the outer wall, px
+    :param seed: seed for scattered pallets, None disables them
+    """
+
+    grid = np.ones((size, size), dtype=np.uint8)
+
+    grid[:wall, :] = 0
+    grid[-wall:, :] = 0
+    grid[:, :wall] = 0
+    grid[:, -wall:] = 0
+
+    margin = wall + aisle_width
+    period = shelf_width + aisle_width
+    block = block_length + cross_aisle
+
+    for r in range(margin, size - margin - shelf_width, period):
+        for c in range(margin, size - margin - block_length, block):
+            grid[r:r + shelf_width, c:c + block_length] = 0
+
+    if seed is not None:
+        rng = np.random.default_rng(seed)
+        count = size * size // 4000
+        rs = rng.integers(margin, size - margin, count)
+        cs = rng.integers(margin, size - margin, count)
+        grid[rs, cs] = 0
+
+    return grid
+
+
+def free_corners(grid: np.ndarray) -> tuple[tuple[int, int], tuple[int, int]]:
+    """Free cells closest to the top-left and bottom-right corners of the grid"""
+
+    free = np.argwhere(grid != 0)
+    start = free[np.argmin(free.sum(axis=1))]
+    goal = free[np.argmax(free.sum(axis=1))]
+
+    return (int(start[0]), int(start[1])), (int(goal[0]), int(goal[1]))
@@ -2,42 +2,100 @@ from miniros import AsyncROSClient
 from miniros.util.decorators import decorators
 from miniros.util.datatypes import Vector, Int
 from miniros.util.util import Ticker
-from miniros_vslam.source.datatypes import SLAMMap, SLAMPosition
+from miniros_vslam.source.datatypes import SLAMMapDelta, SLAMPosition
+from miniros_vslam.source.mapstore import MapStore
+from miniros_vpathfinder.source.dstar import DStarLite, changed_cells
+from miniros_vpathfinder.source.costmap import Costmap
+from miniros_vpathfinder.source.mapbuffer import MapBuffer
+from miniros_vpathfinder.source.tracking import PathTracker
 import miniros_vpathfinder.source.algorithms as algos
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import math
 import numpy as np
 
 
+ROBOT_RADIUS_PX = 15
+
+
+PLANNERS = {
+    "astar": algos.astar,
+    "flat": algos.astar_flat,
+    "hierarchical": algos.hierarchical_astar,
+    "jps": algos.jps,
+}
+
+
+class StalePlan(Exception):
+    """Raised in the worker when a newer goal made its job stale, carries the map deltas it did not merge"""
+
+    def __init__(self, s_map_deltas=()):
+        super().__init__()
+        self.s_map_deltas = list(s_map_deltas)
+
+
 class VPathfinderClient(AsyncROSClient):
-    def __init__(self, ip = "localhost", port = 3000):
+    def __init__(self, ip = "localhost", port = 3000, planner = "hierarchical", incremental = False, map_path = None):
         super().__init__("vpathfinder", ip, port)
 
-        self.s_map = None
+        self.planner = PLANNERS[planner]
+        self.incremental = incremental # keep a D* Lite search between ticks instead of rebuilding
+
+        self.s_map_deltas = [] # map deltas not yet merged into p_map by the worker
         self.s_pos = None
         self.s_ang = None
 
         self.p_end = None
         self.p_alive = False
         self.p_path = None
+        self.p_tracker = PathTracker()
 
         self.p_path_built = False
         self.p_path_built_ticks = 0
 
-        self.m_now_moving = None
+        self.p_map = MapBuffer()
+        self.p_map_path = map_path # read the map from vslam's mmap storage instead of mapdelta messages
+        self.p_store = None
+        self.p_store_seq = None
+        self.p_store_snapshot = None
+        self.p_grid = None
+        self.p_dstar = None
+        self.p_costmap = Costmap()
+
+        # planning runs in a single worker so the event loop keeps serving messages;
+        # map buffer, costmap, D* Lite state and p_grid are only touched from that worker
+        self.p_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vpathfinder-plan")
+        self.p_job = None
+        self.p_job_rebuild = False
+        self.p_job_generation = 0
+        self.p_generation = 0 # bumped when a new goal makes running jobs stale, checked by the worker
+
+    def log(self, message: str):
+        print(f"[vpathfinder] {message}")
 
     @decorators.aparsedata(Vector)
     async def on_end(self, data: Vector, node: str):
-        if not self.p_alive:
-            self.p_end = (data.x, data.z)
-            self.p_alive = True
+        end = (data.x, data.z)
+        if end == self.p_end:
+            return
 
-            self.p_path_built = False
-            self.p_path_built_ticks = 0
+        self.p_end = end
+        self.p_alive = True
+
+        # the old path leads to the old goal, stop following it and plan from scratch
+        self.p_path = None
+        self.p_path_built = False
+        self.p_path_built_ticks = 0
+
+        # a running job can't be interrupted from here, the worker sees the new generation and gives up
+        self.p_generation += 1
 
-    @decorators.aparsedata(SLAMMap)
-    async def on_vslam_map(self, data: SLAMMap):
-        self.s_map = data.to_numpy(int(math.sqrt(len(data.data))))
+    @decorators.aparsedata(SLAMMapDelta)
+    async def on_vslam_mapdelta(self, data: SLAMMapDelta):
+        if data.keyframe:
+            self.s_map_deltas = [data] # everything before a keyframe is superseded by it
+        else:
+            self.s_map_deltas.append(data)
 
     @decorators.aparsedata(SLAMPosition)
     async def on_vslam_pos(self, data: SLAMPosition):
@@ -45,36 +103,159 @@ class VPathfinderClient(AsyncROSClient):
         self.s_ang = data.rot_to_numpy()
 
     async def on_moved(self, data: int, node: str):
-        if self.p_path is not None and self.p_path_built:
-            cur_pos = self.m_now_moving
-
-            prev_ind = np.argmin([algos.astar_heuristic(cur_pos, p) for p in self.p_path])
-            next_ind = max(prev_ind + 1, len(self.p_path) - 1)
-
-            next_pos = self.p_path
+        if self.p_path is not None and self.p_path_built and self.s_pos is not None:
+            prev_ind = self.p_tracker.update((self.s_pos[0], self.s_pos[2]))
+            next_ind, next_pos = self.p_tracker.next_waypoint()
 
             await self.anon(node, "moveto", Vector.encode(
-                Vector(next_pos[0], 0 + next_ind == prev_ind, next_pos[1])  
+                Vector(next_pos[0], int(next_ind == prev_ind), next_pos[1])
             ))
 
-    def build_path(self):
-        global_grid = algos.prepare_map(self.s_map)
-        path = algos.astar(global_grid, (int(self.s_pos[0]), int(self.s_pos[2])), self.p_end)
-        simplified = algos.simplify_path(path, global_grid)
-        smoothed = algos.smooth_path(simplified, global_grid)
+    def update_map(self, s_map_deltas) -> bool:
+        """Merges map deltas into the buffer and refreshes the costmap, returns whether the map changed"""
 
-        self.p_path = smoothed # TODO: ADD ADAPTIVE MAX_LOOKAHEAD
-        self.p_path_built = True
-        self.p_path_built_ticks = 0
+        changed = False
+        for delta in s_map_deltas:
+            changed |= self.p_map.apply_delta(delta)
+
+        if self.p_map_path is not None:
+            changed |= self.read_store()
+
+        if not changed:
+            return False
+
+        self.p_costmap.update(self.p_map.map, self.p_map.version, self.p_map.dirty_region())
+        self.p_map.clear_dirty()
+        return True
+
+    def read_store(self) -> bool:
+        if self.p_store is None:
+            try:
+                self.p_store = MapStore(self.p_map_path, readonly=True)
+            except (OSError, ValueError):
+                return False # vslam has not created it yet
+
+        if self.p_store.seq == self.p_store_seq:
+            return False
+
+        try:
+            self.p_store_snapshot, self.p_store_seq, _ = self.p_store.snapshot(self.p_store_snapshot)
+        except TimeoutError:
+            return False # plan on the previous map, retried next tick
 
-    def update_path(self):
-        dilated = algos.prepare_map(self.s_map)
+        return self.p_map.update(self.p_store_snapshot)
 
-        path = algos.local_update_path(self.p_path, (int(self.s_pos[0]), int(self.s_pos[2])), dilated)
-        simplified = algos.simplify_path(path, dilated)
-        smoothed = algos.smooth_path(simplified, dilated, iterations=20)
+    def _check_stale(self, generation: int, s_map_deltas=()):
+        if generation != self.p_generation:
+            raise StalePlan(s_map_deltas)
 
-        self.p_path = smoothed # TODO: ADD ADAPTIVE MAX_LOOKAHEAD
+    def build_path(self, generation, s_map_deltas, s_pos, p_end):
+        self._check_stale(generation, s_map_deltas)
+        self.update_map(s_map_deltas)
+        if self.p_map.map is None:
+            return None
+        self._check_stale(generation)
+
+        global_grid = self.p_costmap.free(ROBOT_RADIUS_PX)
+        obstacles = self.p_costmap.inflated(ROBOT_RADIUS_PX)
+        start = (int(s_pos[0]), int(s_pos[2]))
+
+        if self.incremental:
+            self.p_dstar = DStarLite(global_grid, start, p_end)
+            path = self.p_dstar.plan()
+        else:
+            path = self.planner(global_grid, start, p_end)
+
+        self.p_grid = global_grid
+        if path is None:
+            return None
+        self._check_stale(generation)
+
+        simplified = algos.simplify_path(path, obstacles)
+        return algos.smooth_path_vectorized(simplified, self.p_costmap, robot_radius=ROBOT_RADIUS_PX) # TODO: ADD ADAPTIVE MAX_LOOKAHEAD
+
+    def update_path(self, generation, s_map_deltas, s_pos, p_path, p_cursor):
+        self._check_stale(generation, s_map_deltas)
+        map_changed = self.update_map(s_map_deltas)
+        self._check_stale(generation)
+
+        local_grid = self.p_costmap.free(ROBOT_RADIUS_PX)
+        obstacles = self.p_costmap.inflated(ROBOT_RADIUS_PX)
+        start = (int(s_pos[0]), int(s_pos[2]))
+
+        if self.p_dstar is not None:
+            if not map_changed:
+                changed = ()
+            else:
+                changed = changed_cells(self.p_grid, local_grid, self.p_costmap.changed_region)
+            path = self.p_dstar.update(local_grid, start, changed)
+            if path is None:
+                return None # the change blocked every way to the goal
+        else:
+            path = algos.local_update_path(p_path, start, local_grid, current_idx=p_cursor)
+
+        self.p_grid = local_grid
+        self._check_stale(generation)
+
+        simplified = algos.simplify_path(path, obstacles)
+        return algos.smooth_path_vectorized(simplified, self.p_costmap, iterations=20, robot_radius=ROBOT_RADIUS_PX) # TODO: ADD ADAPTIVE MAX_LOOKAHEAD
+
+    def submit_plan(self):
+        """Starts a planning job on the worker from a snapshot of the latest map, position and goal"""
+
+        if self.p_job is not None or self.s_pos is None:
+            return
+
+        s_map_deltas, self.s_map_deltas = self.s_map_deltas, []
+
+        rebuild = not self.p_path_built or (self.p_path_built_ticks >= 40 and not self.incremental) # fully reconstruct path every 20 sec
+        if rebuild:
+            args = (self.build_path, self.p_generation, s_map_deltas, self.s_pos, self.p_end)
+        else:
+            args = (self.update_path, self.p_generation, s_map_deltas, self.s_pos, self.p_path, self.p_tracker.cursor)
+
+        self.p_job = asyncio.get_running_loop().run_in_executor(self.p_executor, *args)
+        self.p_job_rebuild = rebuild
+        self.p_job_generation = self.p_generation
+
+    def collect_plan(self):
+        """Publishes the result of a finished job unless a newer goal made it stale"""
+
+        if self.p_job is None or not self.p_job.done():
+            return
+
+        job, self.p_job = self.p_job, None
+        error = job.exception()
+
+        if isinstance(error, StalePlan):
+            # deltas of a job that gave up before merging them go before the ones received since
+            self.s_map_deltas[:0] = error.s_map_deltas
+            return
+
+        if error is not None:
+            self.log(f"Planning failed: {error!r}")
+            return
+
+        if self.p_job_generation != self.p_generation:
+            return # finished just before a new goal arrived
+
+        path = job.result()
+        if path is None:
+            if self.p_path is not None:
+                self.log("No path to goal, replanning")
+
+            # stop following the old path, it may run into whatever blocked it
+            self.p_path = None
+            self.p_path_built = False
+            return
+
+        self.p_path = path
+        self.p_tracker.set_path(path, (self.s_pos[0], self.s_pos[2]))
+        if self.p_job_rebuild:
+            self.p_path_built = True
+            self.p_path_built_ticks = 0
+        else:
+            self.p_path_built_ticks += 1
 
 
 async def main():
@@ -87,16 +268,10 @@ async def main():
         while True:
             await ticker.tick_async()
 
-            if client.p_alive and client.p_path_built:
-                if client.p_path_built_ticks >= 40: # fully reconstruct path every 20 sec
-                    client.build_path()
-
-                else:
-                    client.update_path()
-                    client.p_path_built_ticks += 1
+            client.collect_plan()
 
-            elif client.p_alive:
-                client.build_path()
+            if client.p_alive:
+                client.submit_plan()
 
     await asyncio.gather(
         client.run(),
@@ -1,7 +1,13 @@
 import numpy as np
-from scipy.ndimage import binary_dilation
+from scipy.ndimage import binary_dilation, distance_transform_edt
 from scipy.spatial.distance import cdist
 from heapq import heappush, heappop
+import math
+
+SQRT2 = math.sqrt(2)
+
+# SLAM map cells: 0 wall, 127 unknown, 255 free; anything darker than unknown is an obstacle
+OBSTACLE_THRESHOLD = 127
 
 def astar_heuristic(a, b):
     return np.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2)
@@ -51,8 +57,430 @@ def astar(grid, start, goal):
         
     return None
 
-def local_update_path(global_path, current_pos, local_map, update_radius=10):
-    current_idx = np.argmin([astar_heuristic(current_pos, p) for p in global_path])
+def octile_heuristic(a, b):
+    dy = abs(a[0] - b[0])
+    dx = abs(a[1] - b[1])
+    return dx + dy + (SQRT2 - 2) * min(dx, dy)
+
+class GridAStar:
+    """
+    A* over a 8-connected grid with state kept in flat preallocated arrays
+
+    Cells are addressed by linearised id (`row * cols + col`), so g-cost, parent
+    and closed flags live in plain arrays instead of dicts keyed by tuples.
+    Buffers grow to the largest grid seen and are reused between searches.
+
+    Grid convention is the same as `astar`: nonzero cells are traversable
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.capacity = 0
+        self._reserve(capacity)
+
+    def _reserve(self, size: int):
+        if size <= self.capacity:
+            return
+
+        self.g_cost = np.empty(size, dtype=np.float32)
+        self.parent = np.empty(size, dtype=np.int32)
+        self.closed = np.empty(size, dtype=np.uint8)
+        self.capacity = size
+
+    def search(self, grid, start, goal):
+        grid = np.asarray(grid)
+        rows, cols = grid.shape
+        n = rows * cols
+
+        sr, sc = int(start[0]), int(start[1])
+        gr, gc = int(goal[0]), int(goal[1])
+
+        if not (0 <= sr < rows and 0 <= sc < cols and 0 <= gr < rows and 0 <= gc < cols):
+            return None
+
+        self._reserve(n)
+
+        g_cost = self.g_cost[:n]
+        closed = self.closed[:n]
+        g_cost.fill(np.inf)
+        closed.fill(0)
+
+        # memoryviews index several times faster than numpy scalars from python
+        passable = memoryview(np.ascontiguousarray(grid != 0).ravel())
+        g_mv = memoryview(g_cost)
+        parent_mv = memoryview(self.parent[:n])
+        closed_mv = memoryview(closed)
+
+        moves = [
+            (dr, dc, dr * cols + dc, 1.0 if dr == 0 or dc == 0 else SQRT2)
+            for dr, dc in (
+                (-1, -1), (-1, 0), (-1, 1),
+                (0, -1),           (0, 1),
+                (1, -1),  (1, 0),  (1, 1)
+            )
+        ]
+
+        start_id = sr * cols + sc
+        goal_id = gr * cols + gc
+
+        g_mv[start_id] = 0.0
+        parent_mv[start_id] = -1
+
+        h = octile_heuristic((sr, sc), (gr, gc))
+        open_set = [(h, h, start_id)]
+
+        while open_set:
+            _, _, current = heappop(open_set)
+            if closed_mv[current]:
+                continue
+
+            if current == goal_id:
+                return self._reconstruct(parent_mv, current, cols)
+
+            closed_mv[current] = 1
+            r, c = divmod(current, cols)
+            g_current = g_mv[current]
+
+            for dr, dc, offset, move_cost in moves:
+                nr = r + dr
+                nc = c + dc
+                if not (0 <= nr < rows and 0 <= nc < cols):
+                    continue
+
+                neighbor = current + offset
+                if closed_mv[neighbor] or not passable[neighbor]:
+                    continue
+
+                t_g = g_current + move_cost
+                if t_g < g_mv[neighbor]:
+                    g_mv[neighbor] = t_g
+                    parent_mv[neighbor] = current
+
+                    dy = abs(nr - gr)
+                    dx = abs(nc - gc)
+                    h = dx + dy + (SQRT2 - 2) * (dx if dx < dy else dy)
+                    heappush(open_set, (t_g + h, h, neighbor))
+
+        return None
+
+    @staticmethod
+    def _reconstruct(parent, current, cols):
+        path = []
+        while current != -1:
+            path.append(divmod(current, cols))
+            current = parent[current]
+        return path[::-1]
+
+_grid_astar = GridAStar()
+
+def astar_flat(grid, start, goal):
+    """Drop-in replacement for `astar` backed by `GridAStar` buffers"""
+    return _grid_astar.search(grid, start, goal)
+
+def jps(grid, start, goal):
+    """
+    Jump Point Search over the same 8-connected grid as `astar` (diagonal moves may cut
+    corners). Expands only jump points, so open aisles are crossed in one step instead of
+    cell by cell. Returns the full cell-by-cell path in `astar` format.
+
+    Straight jumps are answered from per row / per column tables of the next blocked or
+    forced cell, built with numpy the first time a row or column is scanned.
+    """
+    grid = np.ascontiguousarray(np.asarray(grid) != 0)
+    rows, cols = grid.shape
+    passable = memoryview(grid.ravel())
+
+    sr, sc = int(start[0]), int(start[1])
+    gr, gc = int(goal[0]), int(goal[1])
+
+    if not (0 <= sr < rows and 0 <= sc < cols and 0 <= gr < rows and 0 <= gc < cols):
+        return None
+
+    if (sr, sc) == (gr, gc):
+        return [(sr, sc)]
+
+    def free(r, c):
+        return 0 <= r < rows and 0 <= c < cols and passable[r * cols + c]
+
+    blocked_row = np.zeros(cols, dtype=bool)
+    blocked_col = np.zeros(rows, dtype=bool)
+    tables = {}
+
+    def row_table(r, dc):
+        table = tables.get((0, r, dc))
+        if table is None:
+            table = _jump_table(
+                grid[r],
+                grid[r - 1] if r > 0 else blocked_row,
+                grid[r + 1] if r < rows - 1 else blocked_row,
+                dc,
+            )
+            tables[(0, r, dc)] = table
+        return table
+
+    def col_table(c, dr):
+        table = tables.get((1, c, dr))
+        if table is None:
+            table = _jump_table(
+                grid[:, c],
+                grid[:, c - 1] if c > 0 else blocked_col,
+                grid[:, c + 1] if c < cols - 1 else blocked_col,
+                dr,
+            )
+            tables[(1, c, dr)] = table
+        return table
+
+    def jump_straight(r, c, dr, dc):
+        if dc:
+            if not 0 <= c + dc < cols:
+                return None
+            event = row_table(r, dc)[c + dc]
+            if r == gr and (c < gc < event if dc > 0 else event < gc < c):
+                return r, gc
+            if event in (-1, cols) or not passable[r * cols + event]:
+                return None
+            return r, event
+
+        if not 0 <= r + dr < rows:
+            return None
+        event = col_table(c, dr)[r + dr]
+        if c == gc and (r < gr < event if dr > 0 else event < gr < r):
+            return gr, c
+        if event in (-1, rows) or not passable[event * cols + c]:
+            return None
+        return event, c
+
+    def jump(r, c, dr, dc):
+        if not (dr and dc):
+            return jump_straight(r, c, dr, dc)
+
+        while True:
+            r += dr
+            c += dc
+            if not free(r, c):
+                return None
+
+            if r == gr and c == gc:
+                return r, c
+
+            if (not free(r - dr, c) and free(r - dr, c + dc)) or \
+               (not free(r, c - dc) and free(r + dr, c - dc)):
+                return r, c
+
+            if jump_straight(r, c, dr, 0) is not None or jump_straight(r, c, 0, dc) is not None:
+                return r, c
+
+    def directions(r, c, parent):
+        if parent is None:
+            return [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+        pr, pc = parent
+        dr = (r > pr) - (r < pr)
+        dc = (c > pc) - (c < pc)
+
+        if dr and dc:
+            dirs = [(dr, 0), (0, dc), (dr, dc)]
+            if not free(r - dr, c):
+                dirs.append((-dr, dc))
+            if not free(r, c - dc):
+                dirs.append((dr, -dc))
+        elif dc:
+            dirs = [(0, dc)]
+            if not free(r + 1, c):
+                dirs.append((1, dc))
+            if not free(r - 1, c):
+                dirs.append((-1, dc))
+        else:
+            dirs = [(dr, 0)]
+            if not free(r, c + 1):
+                dirs.append((dr, 1))
+            if not free(r, c - 1):
+                dirs.append((dr, -1))
+
+        return dirs
+
+    goal_cell = (gr, gc)
+    start_cell = (sr, sc)
+
+    g_score = {start_cell: 0.0}
+    came_from = {}
+    closed = set()
+
+    h = octile_heuristic(start_cell, goal_cell)
+    open_set = [(h, h, start_cell)]
+
+    while open_set:
+        _, _, current = heappop(open_set)
+        if current in closed:
+            continue
+
+        if current == goal_cell:
+            return _expand_jump_points(reconstruct_path(came_from, current))
+
+        closed.add(current)
+        r, c = current
+
+        for dr, dc in directions(r, c, came_from.get(current)):
+            point = jump(r, c, dr, dc)
+            if point is None or point in closed:
+                continue
+
+            steps = max(abs(point[0] - r), abs(point[1] - c))
+            t_g = g_score[current] + steps * (SQRT2 if dr and dc else 1.0)
+
+            if t_g < g_score.get(point, np.inf):
+                g_score[point] = t_g
+                came_from[point] = current
+
+                h = octile_heuristic(point, goal_cell)
+                heappush(open_set, (t_g + h, h, point))
+
+    return None
+
+def _jump_table(line, side_a, side_b, step):
+    """
+    Index of the first cell at or after each cell (walking by `step`) where a straight
+    jump along `line` stops: a blocked cell or a cell with a forced neighbour.
+    Cells past the end are -1 or len(line).
+    """
+    n = len(line)
+    ahead_a = np.zeros(n, dtype=bool)
+    ahead_b = np.zeros(n, dtype=bool)
+
+    if step > 0:
+        ahead_a[:-1] = side_a[1:]
+        ahead_b[:-1] = side_b[1:]
+    else:
+        ahead_a[1:] = side_a[:-1]
+        ahead_b[1:] = side_b[:-1]
+
+    event = ~line | (~side_a & ahead_a) | (~side_b & ahead_b)
+    index = np.arange(n)
+
+    if step > 0:
+        return np.minimum.accumulate(np.where(event, index, n)[::-1])[::-1].tolist()
+    return np.maximum.accumulate(np.where(event, index, -1)).tolist()
+
+def _expand_jump_points(points):
+    path = [points[0]]
+    for (r0, c0), (r1, c1) in zip(points, points[1:]):
+        dr = (r1 > r0) - (r1 < r0)
+        dc = (c1 > c0) - (c1 < c0)
+        for k in range(1, max(abs(r1 - r0), abs(c1 - c0)) + 1):
+            path.append((r0 + k * dr, c0 + k * dc))
+    return path
+
+def build_pyramid(grid, levels=3):
+    """
+    Coarse levels of a traversability grid, each half the resolution of the previous one
+
+    A coarse cell is traversable only if every cell it covers is, so a coarse path
+    never crosses an obstacle of the full resolution grid
+    """
+    pyramid = [np.asarray(grid) != 0]
+
+    for _ in range(levels):
+        fine = pyramid[-1]
+        rows, cols = -(-fine.shape[0] // 2) * 2, -(-fine.shape[1] // 2) * 2
+
+        padded = np.zeros((rows, cols), dtype=bool)
+        padded[:fine.shape[0], :fine.shape[1]] = fine
+
+        pyramid.append(padded.reshape(rows // 2, 2, cols // 2, 2).all(axis=(1, 3)))
+
+    return pyramid
+
+def hierarchical_astar(grid, start, goal, levels=3, corridor=2, window=16, pyramid=None):
+    """
+    Plans on the coarsest level of the grid pyramid and refines the result at full
+    resolution inside a corridor around the coarse path, one window at a time.
+    Falls back to finer levels (and finally to `astar_flat`) when a level has no path.
+
+    :param levels: number of coarse levels, the coarsest one is 2**levels times smaller
+    :param corridor: corridor half-width around the coarse path, coarse cells
+    :param window: number of coarse path cells refined per full resolution search
+    :param pyramid: prebuilt `build_pyramid(grid, levels)` output
+    """
+    if pyramid is None:
+        pyramid = build_pyramid(grid, levels)
+
+    start = (int(start[0]), int(start[1]))
+    goal = (int(goal[0]), int(goal[1]))
+
+    for level in range(len(pyramid) - 1, 0, -1):
+        path = _refine_coarse_path(pyramid, level, start, goal, corridor, window)
+        if path is not None:
+            return path
+
+    return astar_flat(pyramid[0], start, goal)
+
+def _refine_coarse_path(pyramid, level, start, goal, corridor, window):
+    fine = pyramid[0]
+    scale = 2 ** level
+
+    coarse = pyramid[level].copy()
+    coarse_start = (start[0] // scale, start[1] // scale)
+    coarse_goal = (goal[0] // scale, goal[1] // scale)
+
+    if not (0 <= coarse_start[0] < coarse.shape[0] and 0 <= coarse_start[1] < coarse.shape[1] and
+            0 <= coarse_goal[0] < coarse.shape[0] and 0 <= coarse_goal[1] < coarse.shape[1]):
+        return None
+
+    # cells holding the endpoints may be partially blocked, the fine search handles them
+    coarse[coarse_start] = True
+    coarse[coarse_goal] = True
+
+    coarse_path = astar_flat(coarse, coarse_start, coarse_goal)
+    if coarse_path is None:
+        return None
+
+    if len(coarse_path) == 1:
+        coarse_path = coarse_path * 2
+
+    coarse_path = np.asarray(coarse_path)
+    kernel = np.ones((2 * corridor + 1, 2 * corridor + 1), dtype=bool)
+
+    path = [start]
+    i = 0
+    while i < len(coarse_path) - 1:
+        j = min(i + window, len(coarse_path) - 1)
+        chunk = coarse_path[i:j + 1]
+
+        if j == len(coarse_path) - 1:
+            target = goal
+        else:
+            target = (
+                min(int(chunk[-1][0]) * scale + scale // 2, fine.shape[0] - 1),
+                min(int(chunk[-1][1]) * scale + scale // 2, fine.shape[1] - 1),
+            )
+
+        r0, c0 = np.maximum(chunk.min(axis=0) - corridor, 0)
+        r1, c1 = np.minimum(chunk.max(axis=0) + corridor + 1, coarse.shape)
+
+        mask = np.zeros((r1 - r0, c1 - c0), dtype=bool)
+        mask[chunk[:, 0] - r0, chunk[:, 1] - c0] = True
+        mask = binary_dilation(mask, structure=kernel)
+        mask = np.repeat(np.repeat(mask, scale, axis=0), scale, axis=1)
+
+        fr0, fc0 = r0 * scale, c0 * scale
+        local = fine[fr0:r1 * scale, fc0:c1 * scale] & mask[:fine.shape[0] - fr0, :fine.shape[1] - fc0]
+
+        local_path = astar_flat(
+            local,
+            (path[-1][0] - fr0, path[-1][1] - fc0),
+            (target[0] - fr0, target[1] - fc0),
+        )
+        if local_path is None:
+            return None
+
+        path.extend((r + fr0, c + fc0) for r, c in local_path[1:])
+        i = j
+
+    return path
+
+def local_update_path(global_path, current_pos, local_map, update_radius=10, current_idx=None):
+    global_path = np.asarray(global_path)
+    if current_idx is None:
+        current_idx = int(np.argmin(np.sum((global_path - np.asarray(current_pos)) ** 2, axis=1)))
 
     start_idx = max(0, current_idx - 2)
     end_idx = min(len(global_path) - 1, current_idx + update_radius)
@@ -60,38 +488,61 @@ def local_update_path(global_path, current_pos, local_map, update_radius=10):
     local_start = global_path[start_idx]
     local_goal = global_path[end_idx]
 
-    has_collision = False
-    for point in global_path:
-        y, x = int(point[0]), int(point[1])
-        if not (0 <= y < local_map.shape[0] and 0 <= x < local_map.shape[1]):
-            continue
-
-        if local_map[y, x] == 0:
-            has_collision = True
-            break
+    points = global_path.astype(int)
+    inside = (points[:, 0] >= 0) & (points[:, 0] < local_map.shape[0]) & \
+             (points[:, 1] >= 0) & (points[:, 1] < local_map.shape[1])
+    points = points[inside]
 
-    if not has_collision:
+    if not np.any(local_map[points[:, 0], points[:, 1]] == 0):
         return global_path
 
-    local_path = astar(local_map, local_start, local_goal)
+    local_path = astar_flat(local_map, local_start, local_goal)
     if not local_path:
         return global_path
 
-    return global_path[:start_idx] + local_path + global_path[end_idx+1:]        
+    return np.concatenate([global_path[:start_idx], np.asarray(local_path), global_path[end_idx+1:]])
 
-def smooth_path(path, grid, alpha=0.5, beta=0.1, iterations=100):
+def smooth_path(path, grid, alpha=0.5, beta=0.1, iterations=100, costmap=None, robot_radius=0):
     """Сглаживание пути градиентным спуском"""
     path = np.array(path)
     for _ in range(iterations):
         for i in range(1, len(path)-1):
             original = path[i] - path[i]
             smoothness = (path[i-1] + path[i+1] - 2*path[i])
-            obs_force = obstacle_force(path[i], grid)
+            if costmap is not None:
+                obs_force = costmap.force(path[i], robot_radius)
+            else:
+                obs_force = obstacle_force(path[i], grid)
             path[i] += (alpha * original + \
                     beta * smoothness + \
                     0.2 * obs_force).astype(np.uint32)
     return path
 
+def smooth_path_vectorized(path, costmap, alpha=0.5, beta=0.1, gamma=0.2, iterations=100,
+                           robot_radius=0, tolerance=1e-2):
+    """
+    Gradient descent smoothing of all interior points at once, in float coordinates
+
+    Obstacle forces come from the costmap gradient field. Stops early once no point
+    moves more than `tolerance` px in an iteration. Endpoints are kept in place.
+    """
+    original = np.asarray(path, dtype=np.float64)
+    path = original.copy()
+    if len(path) < 3:
+        return path
+
+    inner = path[1:-1]
+    for _ in range(iterations):
+        update = alpha * (original[1:-1] - inner) + \
+                 beta * (path[:-2] + path[2:] - 2 * inner) + \
+                 gamma * costmap.force(inner, robot_radius)
+        inner += update
+
+        if np.abs(update).max() < tolerance:
+            break
+
+    return path
+
 def obstacle_force(point, grid, radius=4):
     force = np.zeros(2)
     for dx in range(-radius, radius+1):
@@ -108,13 +559,19 @@ def obstacle_force(point, grid, radius=4):
     
     return force
 
-def prepare_map(map, robot_radius):
-    obstacle_mask = map < 0
-    y, x = np.ogrid[-robot_radius:robot_radius+1,-robot_radius:robot_radius+1]
-    kernel = (x*x + y*y <= robot_radius ** 2).astype(np.uint8)
-    return binary_dilation(obstacle_mask, structure=kernel)
+def distance_map(map, obstacle_threshold=OBSTACLE_THRESHOLD):
+    """Euclidean distance from every cell to the nearest obstacle (map value below threshold), px"""
+    obstacle_mask = np.asarray(map) < obstacle_threshold
+    if not obstacle_mask.any():
+        return np.full(obstacle_mask.shape, np.inf, dtype=np.float32)
+    return distance_transform_edt(~obstacle_mask).astype(np.float32)
+
+def prepare_map(map, robot_radius, obstacle_threshold=OBSTACLE_THRESHOLD):
+    # thresholding the distance transform is the same as dilating with a disc of robot_radius
+    return distance_map(map, obstacle_threshold) <= robot_radius
 
 def simplify_path(path, grid, max_lookahead=50, min_segment_length=10):
+    path = np.asarray(path)
     if len(path) < 10:
         return [path[0], path[-1]]
     
@@ -122,22 +579,61 @@ def simplify_path(path, grid, max_lookahead=50, min_segment_length=10):
     current_idx = 0
     
     while current_idx < len(path) - 1:
-        next_idx = current_idx + 1
-        best_idx = next_idx
-        
+        best_idx = current_idx + 1
         end_idx = min(current_idx + max_lookahead, len(path)-1)
-        
-        for test_idx in range(current_idx + 2, end_idx + 1):
-            if is_line_safe(path[current_idx], path[test_idx], grid):
-                # Проверяем, что сегмент достаточно длинный
-                if np.linalg.norm(path[test_idx] - path[current_idx]) > min_segment_length:
-                    best_idx = test_idx
+
+        # farthest visible point far enough away, all candidates checked in one call
+        candidates = np.arange(current_idx + 2, end_idx + 1)
+        if len(candidates):
+            ok = lines_safe(grid, path[current_idx], path[candidates])
+            ok &= np.linalg.norm(path[candidates] - path[current_idx], axis=1) > min_segment_length
+
+            visible = np.flatnonzero(ok)
+            if len(visible):
+                best_idx = int(candidates[visible[-1]])
         
         simplified.append(path[best_idx])
         current_idx = best_idx
     
     return np.array(simplified)
 
+def lines_safe(grid, starts, ends):
+    """
+    Batched `is_line_safe`: checks many segments against the grid with one lookup
+
+    Interior cells of every segment are sampled as index arrays, out of bounds
+    cells are ignored. `starts` is broadcast against `ends`, so one start point
+    can be tested against many ends.
+
+    Returns bool array, True where the segment does not cross an obstacle
+    """
+    ends = np.atleast_2d(np.asarray(ends)).astype(np.intp)
+    starts = np.broadcast_to(np.asarray(starts).astype(np.intp), ends.shape)
+
+    delta = ends - starts
+    steps = np.abs(delta).max(axis=1)
+    inner = np.maximum(steps - 1, 0)
+
+    safe = np.ones(len(ends), dtype=bool)
+    total = int(inner.sum())
+    if total == 0:
+        return safe
+
+    segment = np.repeat(np.arange(len(ends)), inner)
+    k = np.arange(total) - np.repeat(np.cumsum(inner) - inner, inner) + 1
+
+    t = (k / steps[segment])[:, None]
+    points = np.rint(starts[segment] + t * delta[segment]).astype(np.intp)
+
+    inside = (points[:, 0] >= 0) & (points[:, 0] < grid.shape[0]) & \
+             (points[:, 1] >= 0) & (points[:, 1] < grid.shape[1])
+
+    blocked = np.zeros(total, dtype=bool)
+    blocked[inside] = grid[points[inside, 0], points[inside, 1]] == 1
+
+    safe[segment[blocked]] = False
+    return safe
+
 def is_line_safe(p1, p2, grid):
     points = bresenham_line(p1, p2)
     
@@ -180,8 +676,9 @@ def adaptive_lookahead(speed, rotation_speed):
     rotation_factor = np.clip(1.0 / (abs(rotation_speed) + 0.1, 0.5, 2.0))
     return int(base_distance * speed_factor * rotation_factor)
 
-from matplotlib import pyplot as plt
 def visualize_comparison(original, simplified):
+    from matplotlib import pyplot as plt
+
     plt.figure(figsize=(12, 8))
     plt.plot(original[:,1], original[:,0], 'b-', label='Original Path', alpha=0.5)
     plt.plot(simplified[:,1], simplified[:,0], 'ro-', label='Simplified Path')
@@ -190,18 +687,19 @@ def visualize_comparison(original, simplified):
     plt.show()
 
 
-grid = np.zeros((100, 100), dtype=np.int16)
+if __name__ == "__main__":
+    grid = np.zeros((100, 100), dtype=np.int16)
 
-path = []
-for x in range(100):
-    path.append((x, 0))
+    path = []
+    for x in range(100):
+        path.append((x, 0))
 
-for y in range(100):
-    path.append((100, y))
+    for y in range(100):
+        path.append((100, y))
 
-path = np.asarray(path, dtype=np.int16)
+    path = np.asarray(path, dtype=np.int16)
 
-simplified = simplify_path(path, grid)
-simplified = smooth_path(simplified, grid, iterations=40)
+    simplified = simplify_path(path, grid)
+    simplified = smooth_path(simplified, grid, iterations=40)
 
-visualize_comparison(path, simplified)
\ No newline at end of file
+    visualize_comparison(path, simplified)
\ No newline at end of file
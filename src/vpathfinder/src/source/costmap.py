@@ -0,0 +1,157 @@
+import math
+import numpy as np
+import miniros_vpathfinder.source.algorithms as algos
+
+
+class Costmap:
+    """
+    Obstacle distance field of a SLAM map, computed once per map version
+
+    Inflation at any robot radius is a threshold of the distance field and obstacle
+    gradients are array lookups, so both are cached until the next `update`
+    with a different version.
+
+    Distances are clamped to `max_distance`, which bounds how far a map change can
+    reach, so updates given the changed region only recompute a window around it.
+
+    :param obstacle_threshold: map values below it are obstacles (walls are darker than unknown cells)
+    :param max_distance: distance field clamp, px; None keeps exact distances and disables local updates
+    """
+
+    def __init__(self, obstacle_threshold: int = algos.OBSTACLE_THRESHOLD, max_distance: float | None = 64):
+        self.obstacle_threshold = obstacle_threshold
+        self.max_distance = max_distance
+
+        self.version = None
+        self.distance = None
+        self.changed_region = None # (rows, cols) slices changed by the last update, None if everything
+
+        self._inflated = {}
+        self._free = {}
+        self._gradient = None
+
+    def update(self, map: np.ndarray, version, region: tuple[slice, slice] | None = None) -> bool:
+        """
+        Recomputes the distance field if `version` differs from the cached one
+
+        :param region: (rows, cols) slices of the map changed since the previous version, None if unknown
+
+        Returns whether anything was recomputed
+        """
+
+        if self.distance is not None and version == self.version:
+            return False
+
+        local = region is not None and self.max_distance is not None
+        if local and self.distance is not None and self.distance.shape == map.shape:
+            self._update_region(map, region)
+        else:
+            self.distance = self._distance(map)
+            self.changed_region = None
+
+            self._inflated.clear()
+            self._free.clear()
+            self._gradient = None
+
+        self.version = version
+        return True
+
+    def _distance(self, map: np.ndarray) -> np.ndarray:
+        distance = algos.distance_map(map, self.obstacle_threshold)
+        if self.max_distance is not None:
+            np.minimum(distance, self.max_distance, out=distance)
+        return distance
+
+    def _update_region(self, map: np.ndarray, region: tuple[slice, slice]):
+        rows, cols = region
+        h, w = self.distance.shape
+        reach = math.ceil(self.max_distance)
+
+        # distances can only change within reach of a changed cell,
+        # and are decided by obstacles within reach of those
+        r0, r1 = max(rows.start - reach, 0), min(rows.stop + reach, h)
+        c0, c1 = max(cols.start - reach, 0), min(cols.stop + reach, w)
+        wr0, wr1 = max(r0 - reach, 0), min(r1 + reach, h)
+        wc0, wc1 = max(c0 - reach, 0), min(c1 + reach, w)
+
+        window = self._distance(map[wr0:wr1, wc0:wc1])
+        self.distance[r0:r1, c0:c1] = window[r0 - wr0:r1 - wr0, c0 - wc0:c1 - wc0]
+        self.changed_region = (slice(r0, r1), slice(c0, c1))
+
+        # cached masks may still be held by callers, so patch copies
+        distance = self.distance[r0:r1, c0:c1]
+        for robot_radius, mask in self._inflated.items():
+            mask = mask.copy()
+            mask[r0:r1, c0:c1] = distance <= robot_radius
+            self._inflated[robot_radius] = mask
+        for robot_radius, mask in self._free.items():
+            mask = mask.copy()
+            mask[r0:r1, c0:c1] = distance > robot_radius
+            self._free[robot_radius] = mask
+
+        if self._gradient is not None:
+            # one extra cell around the region keeps central differences exact on its border
+            gr0, gr1 = max(r0 - 1, 0), min(r1 + 1, h)
+            gc0, gc1 = max(c0 - 1, 0), min(c1 + 1, w)
+            patch = np.gradient(self.distance[gr0:gr1, gc0:gc1])
+
+            gradient = []
+            for g, p in zip(self._gradient, patch):
+                g = g.copy()
+                g[r0:r1, c0:c1] = p[r0 - gr0:r1 - gr0, c0 - gc0:c1 - gc0]
+                gradient.append(g)
+            self._gradient = tuple(gradient)
+
+    def inflated(self, robot_radius: float) -> np.ndarray:
+        """Obstacle mask inflated by robot_radius, same as `prepare_map(map, robot_radius)`"""
+
+        mask = self._inflated.get(robot_radius)
+        if mask is None:
+            mask = self.distance <= robot_radius
+            self._inflated[robot_radius] = mask
+        return mask
+
+    def free(self, robot_radius: float) -> np.ndarray:
+        """Traversability grid for planners (nonzero cells are traversable)"""
+
+        mask = self._free.get(robot_radius)
+        if mask is None:
+            mask = ~self.inflated(robot_radius)
+            self._free[robot_radius] = mask
+        return mask
+
+    def gradient(self) -> tuple[np.ndarray, np.ndarray]:
+        """Gradient of the distance field along rows and columns, points away from obstacles"""
+
+        if self._gradient is None:
+            distance = np.minimum(self.distance, np.finfo(np.float32).max)
+            self._gradient = tuple(g.astype(np.float32) for g in np.gradient(distance))
+        return self._gradient
+
+    def _lookup(self, points) -> tuple[np.ndarray, np.ndarray]:
+        points = np.asarray(points)
+        rows = np.clip(np.rint(points[..., 0]).astype(np.intp), 0, self.distance.shape[0] - 1)
+        cols = np.clip(np.rint(points[..., 1]).astype(np.intp), 0, self.distance.shape[1] - 1)
+        return rows, cols
+
+    def is_free(self, points, robot_radius: float) -> np.ndarray:
+        """Whether the robot fits at each of (..., 2) points"""
+
+        rows, cols = self._lookup(points)
+        return self.distance[rows, cols] > robot_radius
+
+    def force(self, points, robot_radius: float = 0, radius: float = 4) -> np.ndarray:
+        """
+        Repulsive force from the nearest inflated obstacle at each of (..., 2) points
+
+        Points farther than `radius` from the inflated obstacles get no force,
+        closer ones are pushed along the distance gradient with strength 1 / distance
+        """
+
+        rows, cols = self._lookup(points)
+        gy, gx = self.gradient()
+
+        clearance = self.distance[rows, cols] - robot_radius
+        strength = np.where(clearance <= radius, 1.0 / np.maximum(clearance, 1.0), 0.0)
+
+        return np.stack([gy[rows, cols] * strength, gx[rows, cols] * strength], axis=-1)
@@ -0,0 +1,228 @@
+import math
+import numpy as np
+from heapq import heappush, heappop
+
+SQRT2 = math.sqrt(2)
+INF = float("inf")
+EPS = 1e-9 # keys are sums of move costs and km, equal paths can differ by rounding
+
+MOVES = (
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1),           (0, 1),
+    (1, -1),  (1, 0),  (1, 1)
+)
+
+
+def changed_cells(old_grid, new_grid, region=None) -> np.ndarray:
+    """
+    Cells whose traversability differs between two grids, as (N, 2) array of (row, col)
+
+    :param region: (rows, cols) slices outside of which the grids are known to be equal
+    """
+    if region is None:
+        return np.argwhere((np.asarray(old_grid) != 0) != (np.asarray(new_grid) != 0))
+
+    rows, cols = region
+    cells = changed_cells(np.asarray(old_grid)[rows, cols], np.asarray(new_grid)[rows, cols])
+    return cells + (rows.start or 0, cols.start or 0)
+
+
+class DStarLite:
+    """
+    Incremental planner (D* Lite) over a 8-connected grid
+
+    The search runs backwards from the goal and its tree persists between calls to
+    `update`, so after a map change only vertices whose cost-to-goal is affected by the
+    changed cells are repaired. Grid convention is the same as `astar`: nonzero cells
+    are traversable.
+
+    :param grid: traversability grid
+    :param start: (row, col) robot cell
+    :param goal: (row, col) goal cell
+    """
+
+    def __init__(self, grid, start, goal):
+        self._set_grid(grid)
+
+        self.start = self._id(start)
+        self.goal = self._id(goal)
+        self.last = self.start
+        self.km = 0.0
+
+        self.g = {}
+        self.rhs = {self.goal: 0.0}
+
+        self.open_set = []
+        self.open_keys = {}
+        self._push(self.goal, self._key(self.goal))
+
+        self.expanded = 0
+
+    def _set_grid(self, grid):
+        grid = np.asarray(grid)
+        self.rows, self.cols = grid.shape
+        self.grid = np.ascontiguousarray(grid != 0).ravel()
+        self.passable = memoryview(self.grid)
+
+    def _id(self, cell) -> int:
+        return int(cell[0]) * self.cols + int(cell[1])
+
+    def _cell(self, id: int) -> tuple[int, int]:
+        return divmod(id, self.cols)
+
+    def _h(self, a: int, b: int) -> float:
+        ar, ac = divmod(a, self.cols)
+        br, bc = divmod(b, self.cols)
+        dy = abs(ar - br)
+        dx = abs(ac - bc)
+        return dx + dy + (SQRT2 - 2) * (dx if dx < dy else dy)
+
+    def _neighbors(self, id: int):
+        r, c = divmod(id, self.cols)
+        for dr, dc in MOVES:
+            nr = r + dr
+            nc = c + dc
+            if 0 <= nr < self.rows and 0 <= nc < self.cols:
+                yield nr * self.cols + nc, 1.0 if dr == 0 or dc == 0 else SQRT2
+
+    def _key(self, id: int) -> tuple[float, float]:
+        m = min(self.g.get(id, INF), self.rhs.get(id, INF))
+        return (m + self._h(self.start, id) + self.km, m)
+
+    def _push(self, id: int, key):
+        self.open_keys[id] = key
+        heappush(self.open_set, (key, id))
+
+    def _top(self):
+        while self.open_set:
+            key, id = self.open_set[0]
+            if self.open_keys.get(id) == key:
+                return key, id
+            heappop(self.open_set)
+        return (INF, INF), None
+
+    def _update_vertex(self, id: int):
+        if id != self.goal:
+            best = INF
+            if self.passable[id]:
+                g = self.g
+                for n, cost in self._neighbors(id):
+                    if self.passable[n]:
+                        v = cost + g.get(n, INF)
+                        if v < best:
+                            best = v
+            self.rhs[id] = best
+
+        if self.g.get(id, INF) != self.rhs.get(id, INF):
+            self._push(id, self._key(id))
+        else:
+            self.open_keys.pop(id, None)
+
+    def _compute_shortest_path(self):
+        g, rhs = self.g, self.rhs
+
+        while True:
+            k_old, u = self._top()
+            if u is None:
+                break
+
+            # keys whose first parts differ by rounding only are heap ordered arbitrarily, so all
+            # of them are expanded rather than trusting the second part; also run until start is
+            # consistent, an overconsistent start (finite rhs, g still INF) leaves no g to follow
+            start_rhs = rhs.get(self.start, INF)
+            start_g = g.get(self.start, INF)
+            if not (k_old[0] <= self._key(self.start)[0] + EPS or start_rhs != start_g):
+                break
+
+            k_new = self._key(u)
+            if k_old < k_new:
+                self._push(u, k_new)
+                continue
+
+            heappop(self.open_set)
+            del self.open_keys[u]
+            self.expanded += 1
+
+            g_u = g.get(u, INF)
+            rhs_u = rhs.get(u, INF)
+
+            if g_u > rhs_u:
+                g[u] = rhs_u
+                if not self.passable[u]:
+                    continue
+                for s, cost in self._neighbors(u):
+                    if s != self.goal and self.passable[s] and cost + rhs_u < rhs.get(s, INF):
+                        rhs[s] = cost + rhs_u
+                        self._push(s, self._key(s))
+            else:
+                g[u] = INF
+                self._update_vertex(u)
+                for s, cost in self._neighbors(u):
+                    if rhs.get(s, INF) == cost + g_u:
+                        self._update_vertex(s)
+
+    def move_start(self, start):
+        start = self._id(start)
+        if start != self.start:
+            self.km += self._h(self.last, start)
+            self.last = start
+            self.start = start
+
+    def update(self, grid, start=None, changed=None):
+        """
+        Repairs the plan after a map change and returns the new path
+
+        :param grid: new traversability grid, same shape as the previous one
+        :param start: new robot cell, keeps the previous one if None
+        :param changed: cells whose traversability changed, computed from the grids if None
+        """
+        if changed is None:
+            changed = changed_cells(self.grid.reshape(self.rows, self.cols), grid)
+
+        self._set_grid(grid)
+
+        if start is not None:
+            self.move_start(start)
+
+        for r, c in changed:
+            id = self._id((r, c))
+            self._update_vertex(id)
+            for n, _ in self._neighbors(id):
+                self._update_vertex(n)
+
+        return self.plan()
+
+    def plan(self):
+        """Computes (or finishes repairing) the plan and returns it as list of (row, col)"""
+        self._compute_shortest_path()
+
+        if self.rhs.get(self.start, INF) == INF:
+            return None
+
+        g, rhs = self.g, self.rhs
+        path = [self._cell(self.start)]
+        current = self.start
+
+        for _ in range(self.rows * self.cols):
+            if current == self.goal:
+                return path
+
+            # vertices left inconsistent beyond the start key can hold a stale, too low g
+            # tying with the true successor, max(g, rhs) never underestimates them
+            # and consistent neighbours win ties
+            best, best_cost = None, (INF, True)
+            for n, cost in self._neighbors(current):
+                if self.passable[n]:
+                    g_n = g.get(n, INF)
+                    rhs_n = rhs.get(n, INF)
+                    v = (cost + (g_n if g_n > rhs_n else rhs_n), g_n != rhs_n)
+                    if v < best_cost:
+                        best, best_cost = n, v
+
+            if best is None or best_cost[0] == INF:
+                return None
+
+            current = best
+            path.append(self._cell(current))
+
+        return None
@@ -0,0 +1,99 @@
+import math
+import numpy as np
+from miniros_vslam.source.datatypes import SLAMMapDelta
+from miniros_vslam.source.mapdelta import MapAssembler
+
+
+class MapBuffer:
+    """
+    Persistent copy of the SLAM map with per-tile change detection
+
+    Incoming map bytes are viewed with `np.frombuffer` (no copy) and compared with
+    the buffer; only changed pixels are written and the version is bumped only when
+    something changed, so downstream caches keyed by version stay valid otherwise.
+    Changed tiles accumulate in `dirty` until `clear_dirty`.
+
+    :param tile: side of a change detection tile, px
+    """
+
+    def __init__(self, tile: int = 64):
+        self.tile = tile
+
+        self.map = None
+        self.version = 0
+        self.dirty = None # bool array of tiles changed since the last clear_dirty
+
+        self.assembler = MapAssembler()
+
+    def _reset(self, map: np.ndarray):
+        self.map = map
+        tiles = -(-map.shape[0] // self.tile)
+        self.dirty = np.ones((tiles, tiles), dtype=bool)
+        self.version += 1
+
+    def update(self, data) -> bool:
+        """Merges new full map bytes into the buffer, returns whether anything changed"""
+
+        incoming = np.frombuffer(data, dtype=np.uint8)
+        size = math.isqrt(len(incoming))
+        incoming = incoming.reshape((size, size))
+
+        if self.map is None or self.map.shape != incoming.shape:
+            self._reset(incoming.copy())
+            return True
+
+        diff = incoming != self.map
+
+        starts = np.arange(0, size, self.tile)
+        dirty = np.logical_or.reduceat(np.logical_or.reduceat(diff, starts, axis=0), starts, axis=1)
+
+        if not dirty.any():
+            return False
+
+        np.copyto(self.map, incoming, where=diff)
+        self.dirty |= dirty
+        self.version += 1
+        return True
+
+    def apply_delta(self, delta: SLAMMapDelta) -> bool:
+        """Applies a map delta to the buffer, returns whether anything changed"""
+
+        changed = self.assembler.apply(delta)
+        if changed is None:
+            return False
+
+        if self.map is not self.assembler.map:
+            self._reset(self.assembler.map)
+            return True
+
+        if not changed:
+            return False
+
+        for rows, cols in changed:
+            self.dirty[rows.start // self.tile:-(-rows.stop // self.tile), cols.start // self.tile:-(-cols.stop // self.tile)] = True
+        self.version += 1
+        return True
+
+    def clear_dirty(self):
+        if self.dirty is not None:
+            self.dirty[:] = False
+
+    def dirty_tiles(self) -> np.ndarray:
+        """(N, 2) array of (row, col) indices of changed tiles"""
+
+        return np.argwhere(self.dirty)
+
+    def dirty_region(self) -> tuple[slice, slice] | None:
+        """Pixel bounding box of changed tiles, None if nothing changed"""
+
+        tiles = self.dirty_tiles()
+        if not len(tiles):
+            return None
+
+        (r0, c0), (r1, c1) = tiles.min(axis=0), tiles.max(axis=0) + 1
+        size = self.map.shape[0]
+
+        return (
+            slice(int(r0) * self.tile, min(int(r1) * self.tile, size)),
+            slice(int(c0) * self.tile, min(int(c1) * self.tile, size)),
+        )
@@ -0,0 +1,73 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class PathTracker:
+    """
+    Robot progress along the current path
+
+    Keeps a monotonic cursor on the closest path point. Regular updates only scan a
+    short window ahead of the cursor (amortised O(1)); when the robot is not found
+    there the cursor is relocated with a KD-tree query (O(log n)).
+
+    :param window: number of path points scanned ahead of the cursor
+    :param lost_distance: distance to the window match after which the KD-tree is queried
+    :param lookahead: how many points ahead of the cursor the next waypoint is
+    """
+
+    def __init__(self, window: int = 16, lost_distance: float = 20, lookahead: int = 1):
+        self.window = window
+        self.lost_distance = lost_distance
+        self.lookahead = lookahead
+
+        self.path = None
+        self.tree = None
+        self.cursor = 0
+
+    def set_path(self, path, position=None):
+        """Replaces the tracked path, relocating the cursor on it if position is known"""
+
+        self.path = np.asarray(path, dtype=np.float64)
+        self.tree = cKDTree(self.path)
+        self.cursor = 0
+
+        if position is not None:
+            self.cursor = self.closest(position)
+
+    def closest(self, position) -> int:
+        """Index of the path point closest to position"""
+
+        _, index = self.tree.query(np.asarray(position, dtype=np.float64))
+        return int(index)
+
+    def update(self, position) -> int:
+        """Advances the cursor to the path point closest to position and returns it"""
+
+        if self.path is None:
+            return 0
+
+        position = np.asarray(position, dtype=np.float64)
+        ahead = self.path[self.cursor:self.cursor + self.window]
+
+        distances = np.einsum("ij,ij->i", ahead - position, ahead - position)
+        best = int(np.argmin(distances))
+
+        still_approaching = best == len(ahead) - 1 and self.cursor + len(ahead) < len(self.path)
+        if still_approaching or distances[best] > self.lost_distance ** 2:
+            index = self.closest(position)
+            # stay monotonic unless the robot really is elsewhere on the path
+            if index > self.cursor or distances[best] > self.lost_distance ** 2:
+                self.cursor = index
+        else:
+            self.cursor += best
+
+        return self.cursor
+
+    def next_waypoint(self) -> tuple[int, np.ndarray]:
+        """Index and coordinates of the waypoint the robot should head to"""
+
+        index = min(self.cursor + self.lookahead, len(self.path) - 1)
+        return index, self.path[index]
+
+    def finished(self) -> bool:
+        return self.path is not None and self.cursor >= len(self.path) - 1
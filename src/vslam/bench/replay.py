@@ -0,0 +1,199 @@
+"""
+Offline SLAM benchmark
+
+Feeds a scan log (recorded by vslam with `record_path`, see
+`miniros_vslam.source.scanlog`) or a simulated run through RMHC SLAM as fast as
+possible and reports throughput, per-scan latency, map update cost and drift.
+
+    python replay.py scans.vscn --threads 2
+    python replay.py --synthetic 500 --save room.vscn
+"""
+
+import argparse
+import math
+import time
+import numpy as np
+import miniros_breezyslam.algorithms as algos
+import miniros_breezyslam.sensors as sensors
+from miniros_vslam.source.frontend import ScanDecimator
+from miniros_vslam.source.scanlog import ScanRecord, ScanWriter, read_scans
+
+
+MAP_SIZE_PX = 4000
+MAP_SIZE_MET = 40
+
+
+def synthetic_scans(count: int, seed: int = 0, rate_hz: float = 5.5, noise_mm: float = 10):
+    """
+    Yields `ScanRecord`s of a robot driving a loop in a 8 x 6 m room with pillars
+
+    Poses are ground truth in the SLAM frame, starting at the map center.
+    """
+    rng = np.random.default_rng(seed)
+    center = 500 * MAP_SIZE_MET
+
+    walls = (center - 3000, center - 2000, center + 5000, center + 4000) # x0, y0, x1, y1
+    pillars = np.array([(center + 1500, center + 2500, 250), (center - 1500, center + 800, 150), (center + 3500, center - 500, 200)])
+
+    for i in range(count):
+        # ellipse through the start point, tangent heading
+        phase = 2 * math.pi * i / count
+        x = center + 1500 * math.sin(phase)
+        y = center + 1000 * (1 - math.cos(phase))
+        theta = math.degrees(math.atan2(1000 * math.sin(phase), 1500 * math.cos(phase)))
+
+        angles = np.sort(rng.uniform(0, 360, 360))
+        # scan angle a looks along theta + a - 180 in the SLAM frame
+        rays = np.radians(theta + angles - 180)
+        dx, dy = np.cos(rays), np.sin(rays)
+
+        with np.errstate(divide="ignore"):
+            tx = np.where(dx > 0, (walls[2] - x) / dx, (walls[0] - x) / dx)
+            ty = np.where(dy > 0, (walls[3] - y) / dy, (walls[1] - y) / dy)
+        distances = np.minimum(np.abs(tx), np.abs(ty))
+
+        for px, py, r in pillars:
+            fx, fy = x - px, y - py
+            b = fx * dx + fy * dy
+            disc = b * b - (fx * fx + fy * fy - r * r)
+            hit = np.where(disc > 0, -b - np.sqrt(np.maximum(disc, 0)), np.inf)
+            distances = np.where((hit > 0) & (hit < distances), hit, distances)
+
+        distances = distances + rng.normal(0, noise_mm, distances.shape)
+        yield ScanRecord(i / rate_hz, distances, angles, (x, y, theta))
+
+
+def make_slam(args):
+    laser = sensors.RPLidarA1()
+
+    if args.algorithm == "multiscale":
+        return algos.MultiScaleRMHC_SLAM(laser, MAP_SIZE_PX, MAP_SIZE_MET, random_seed=args.seed, max_stall_iter=args.max_stall)
+
+    return algos.RMHC_SLAM(
+        laser, MAP_SIZE_PX, MAP_SIZE_MET,
+        random_seed=args.seed,
+        sigma_xy_mm=args.sigma_xy,
+        sigma_theta_degrees=args.sigma_theta,
+        max_search_iter=args.max_iter,
+        search_threads=args.threads,
+        max_stall_iter=args.max_stall,
+    )
+
+
+def replay(records, slam, decimator: ScanDecimator | None = None, export_every: int = 5) -> dict:
+    """Runs SLAM over records, returns timings (s) per used scan and poses"""
+
+    mapbytes = bytearray(MAP_SIZE_PX ** 2)
+
+    latency, search, export = [], [], []
+    evaluations = []
+    poses, truth = [], []
+    skipped = 0
+
+    start = time.perf_counter()
+    for record in records:
+        t0 = time.perf_counter()
+
+        if decimator is not None and not decimator.accept(record.timestamp, record.distances, record.angles)[0]:
+            skipped += 1
+            continue
+
+        slam.update(record.distances.tolist(), scan_angles_degrees=record.angles.tolist())
+        latency.append(time.perf_counter() - t0)
+
+        stats = getattr(slam, "last_stats", None)
+        if stats:
+            search.append(stats["search_seconds"])
+            evaluations.append(stats["evaluations"])
+
+        # vslam copies the changed part of the map out for publishing every few scans
+        if len(latency) % export_every == 0:
+            t0 = time.perf_counter()
+            slam.getmap_dirty(mapbytes)
+            export.append(time.perf_counter() - t0)
+
+        poses.append(slam.getpos())
+        truth.append(record.pose)
+
+    return {
+        "elapsed": time.perf_counter() - start,
+        "latency": np.array(latency),
+        "search": np.array(search),
+        "export": np.array(export),
+        "evaluations": np.array(evaluations),
+        "poses": poses,
+        "truth": truth,
+        "skipped": skipped,
+    }
+
+
+def drift(poses: list, truth: list) -> np.ndarray | None:
+    """Position error (mm) of every pose against the reference, both taken relative to the first pose"""
+
+    if not poses or any(pose is None for pose in truth):
+        return None
+
+    poses = np.array(poses)[:, :2]
+    truth = np.array(truth)[:, :2]
+    return np.linalg.norm((poses - poses[0]) - (truth - truth[0]), axis=1)
+
+
+def report(result: dict):
+    latency = result["latency"] * 1000
+    count = len(latency)
+    if count == 0:
+        print("No scans replayed")
+        return
+
+    print(f"scans:        {count} used, {result['skipped']} skipped")
+    print(f"throughput:   {count / result['elapsed']:.1f} scans/s")
+    print("latency ms:   p50 {:.2f}  p90 {:.2f}  p99 {:.2f}  max {:.2f}".format(*np.percentile(latency, (50, 90, 99)), latency.max()))
+
+    if len(result["search"]):
+        search = result["search"] * 1000
+        print(f"search ms:    mean {search.mean():.2f}, {result['evaluations'].mean():.0f} candidates per scan")
+        print(f"map update:   mean {latency.mean() - search.mean():.2f} ms per scan (scan build and map integration)")
+    if len(result["export"]):
+        print(f"map export:   mean {result['export'].mean() * 1000:.2f} ms per copy")
+
+    x, y, theta = result["poses"][-1]
+    print(f"final pose:   x {x:.0f} mm, y {y:.0f} mm, theta {theta:.1f} deg")
+
+    errors = drift(result["poses"], result["truth"])
+    if errors is not None:
+        print(f"drift mm:     final {errors[-1]:.0f}, mean {errors.mean():.0f}, max {errors.max():.0f}")
+    else:
+        x0, y0, _ = result["poses"][0]
+        print(f"start offset: {math.hypot(x - x0, y - y0):.0f} mm (loop closure error if the run returns to its start)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay lidar scans through SLAM and report performance")
+    parser.add_argument("log", nargs="?", help="scan log recorded by vslam")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="simulate N scans in a room instead of reading a log")
+    parser.add_argument("--save", metavar="PATH", help="write the replayed scans to a scan log")
+    parser.add_argument("--algorithm", choices=("rmhc", "multiscale"), default="rmhc")
+    parser.add_argument("--threads", type=int, default=1, help="parallel RMHC chains")
+    parser.add_argument("--max-iter", type=int, default=1000)
+    parser.add_argument("--max-stall", type=int, default=0, help="stop RMHC after N candidates without improvement")
+    parser.add_argument("--sigma-xy", type=float, default=100)
+    parser.add_argument("--sigma-theta", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--decimate", action="store_true", help="skip stationary scans like vslam does")
+    parser.add_argument("--export-every", type=int, default=5, help="copy the map out every N scans")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        records = list(synthetic_scans(args.synthetic, args.seed))
+    elif args.log:
+        records = list(read_scans(args.log)) # loaded up front so disk reads don't count
+    else:
+        parser.error("give a scan log or --synthetic N")
+
+    if args.save:
+        with ScanWriter(args.save) as writer:
+            for record in records:
+                writer.write(record.timestamp, record.distances, record.angles, record.pose)
+
+    result = replay(records, make_slam(args), ScanDecimator() if args.decimate else None, args.export_every)
+    report(result)
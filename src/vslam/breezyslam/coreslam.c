@@ -92,6 +92,8 @@ static const double DEFAULT_SIGMA_THETA_DEGREES = 20;
 
 static const double DEFAULT_MAX_SEARCH_ITER     = 1000;
 
+static const int    DIRTY_TILE_SHIFT            = 6; /* 64 x 64 pixel dirty tiles */
+
 
 /* Core types --------------------------------------------------------------- */
 
@@ -112,6 +114,13 @@ typedef struct map_t {
     double size_meters;
     
     double scale_pixels_per_mm;
+
+    /* Pixels written since the dirty state was last reset: tile bitmap and bounding box */
+    unsigned char * dirty_tiles;
+    int dirty_tile_shift;               /* tile side is 1 << dirty_tile_shift pixels */
+    int dirty_tiles_per_row;
+    int dirty_x0, dirty_y0;             /* bounding box, empty when dirty_x0 > dirty_x1 */
+    int dirty_x1, dirty_y1;             /* inclusive */
     
 } map_t;
 
@@ -215,6 +224,40 @@ void
 map_set(
     map_t * map, 
     char * bytes);
+
+/* Marks every tile of the map as dirty */
+void
+map_mark_all_dirty(
+    map_t * map);
+
+/* Stores indices (row * dirty_tiles_per_row + col) of dirty tiles into tiles, which must hold
+   dirty_tiles_per_row^2 ints, and returns their count; clears the dirty state if reset is nonzero */
+int
+map_get_dirty_tiles(
+    map_t * map,
+    int * tiles,
+    int reset);
+
+/* Sets every pixel of coarse covering the fine region x0 <= x < x1, y0 <= y < y1 to the minimum
+   (most obstacle-like) of the fine pixels under it; fine size must be a multiple of coarse size */
+void
+map_downsample(
+    map_t * fine,
+    map_t * coarse,
+    int x0,
+    int y0,
+    int x1,
+    int y1);
+
+/* Copies pixels with x0 <= x < x1, y0 <= y < y1 into the same positions of a full-size byte map */
+void
+map_get_region(
+    map_t * map, 
+    char * bytes,
+    int x0,
+    int y0,
+    int x1,
+    int y1);
     
 /* Returns -1 for infinity */
 int 
@@ -235,6 +278,22 @@ rmhc_position_search(
 	int max_search_iter,
 	void * randomizer);
 
+/* Random-Mutation Hill-Climbing search which also stops after max_stall_iter consecutive candidates
+   without improvement (0 for no limit). Stores the distance at the returned position in best_distance
+   and the number of candidates tried in evaluations, either may be NULL. */
+position_t 
+rmhc_position_search_ex(
+    position_t start_pos,
+	map_t * map,
+    scan_t * scan,
+	double sigma_xy_mm,
+	double sigma_theta_degrees,
+	int max_search_iter,
+	int max_stall_iter,
+	void * randomizer,
+	int * best_distance,
+	int * evaluations);
+
 #ifdef __cplusplus 
 }
 #endif
@@ -392,10 +451,27 @@ static int
 }
 
 
+static void
+        mark_dirty_box(
+        map_t * map,
+        int xa,
+        int ya,
+        int xb,
+        int yb)
+{
+    if (xa > xb) swap(&xa, &xb);
+    if (ya > yb) swap(&ya, &yb);
+    
+    if (xa < map->dirty_x0) map->dirty_x0 = xa;
+    if (ya < map->dirty_y0) map->dirty_y0 = ya;
+    if (xb > map->dirty_x1) map->dirty_x1 = xb;
+    if (yb > map->dirty_y1) map->dirty_y1 = yb;
+}
+
+
 static void
         map_laser_ray(
-        pixel_t * map_pixels,
-        int map_size,
+        map_t * map,
         int x1,
         int y1,
         int x2,
@@ -406,6 +482,9 @@ static void
         int alpha)
 {
     
+    pixel_t * map_pixels = map->pixels;
+    int map_size = map->size_pixels;
+    
     int x2c = x2;
     int y2c = y2;
     
@@ -424,6 +503,10 @@ static void
         int incptry = (y2 > y1) ? map_size : -map_size;
         int sincv = (value > NO_OBSTACLE) ? 1 : -1;
         
+        /* pixel coordinate steps matching incptrx, incptry, for dirty tile tracking */
+        int incxx = (x2 > x1) ? 1 : -1, incxy = 0;
+        int incyx = 0, incyy = (y2 > y1) ? 1 : -1;
+        
         int derrorv = 0;
         
         if (dx > dy)
@@ -435,6 +518,8 @@ static void
             swap(&dx, &dy);
             swap(&dxc, &dyc);
             swap(&incptrx, &incptry);
+            swap(&incxx, &incyx);
+            swap(&incxy, &incyy);
             derrorv = abs(yp - y2);
         }
         
@@ -458,8 +543,16 @@ static void
             pixel_t * ptr = map_pixels + y1 * map_size + x1;
             int pixval = NO_OBSTACLE;
             
+            unsigned char * dirty_tiles = map->dirty_tiles;
+            int tile_shift = map->dirty_tile_shift;
+            int tiles_per_row = map->dirty_tiles_per_row;
+            int px = x1;
+            int py = y1;
+            
+            mark_dirty_box(map, x1, y1, x2c, y2c);
+            
             int x = 0;
-            for (x = 0; x <= dxc; x++, ptr += incptrx)
+            for (x = 0; x <= dxc; x++, ptr += incptrx, px += incxx, py += incxy)
             {
                 if (x > dx - 2 * derrorv)
                 {
@@ -487,10 +580,13 @@ static void
                 
                 /* Integration into the map */
                 *ptr = ((256 - alpha) * (*ptr) + alpha * pixval) >> 8;
+                dirty_tiles[(py >> tile_shift) * tiles_per_row + (px >> tile_shift)] = 1;
                 
                 if (error > 0)
                 {
                     ptr += incptry;
+                    px += incyx;
+                    py += incyy;
                     error += diago;
                 } else
                 {
@@ -566,6 +662,11 @@ void
     
     /* precompute scale for efficiency */
     map->scale_pixels_per_mm =  size_pixels / (size_meters * 1000);
+    
+    map->dirty_tile_shift = DIRTY_TILE_SHIFT;
+    map->dirty_tiles_per_row = (size_pixels + (1 << DIRTY_TILE_SHIFT) - 1) >> DIRTY_TILE_SHIFT;
+    map->dirty_tiles = (unsigned char *)safe_malloc(map->dirty_tiles_per_row * map->dirty_tiles_per_row);
+    map_mark_all_dirty(map);
 }
 
 void
@@ -573,6 +674,59 @@ void
         map_t * map)
 {
     free(map->pixels);
+    free(map->dirty_tiles);
+}
+
+void
+        map_mark_all_dirty(
+        map_t * map)
+{
+    memset(map->dirty_tiles, 1, map->dirty_tiles_per_row * map->dirty_tiles_per_row);
+    map->dirty_x0 = 0;
+    map->dirty_y0 = 0;
+    map->dirty_x1 = map->size_pixels - 1;
+    map->dirty_y1 = map->size_pixels - 1;
+}
+
+int
+        map_get_dirty_tiles(
+        map_t * map,
+        int * tiles,
+        int reset)
+{
+    int count = 0;
+    int row, col;
+    
+    if (map->dirty_x0 > map->dirty_x1)
+    {
+        return 0;
+    }
+    
+    /* only tiles inside the bounding box can be dirty */
+    for (row = map->dirty_y0 >> map->dirty_tile_shift; row <= map->dirty_y1 >> map->dirty_tile_shift; ++row)
+    {
+        unsigned char * line = map->dirty_tiles + row * map->dirty_tiles_per_row;
+        
+        for (col = map->dirty_x0 >> map->dirty_tile_shift; col <= map->dirty_x1 >> map->dirty_tile_shift; ++col)
+        {
+            if (line[col])
+            {
+                tiles[count++] = row * map->dirty_tiles_per_row + col;
+                if (reset)
+                {
+                    line[col] = 0;
+                }
+            }
+        }
+    }
+    
+    if (reset)
+    {
+        map->dirty_x0 = map->dirty_y0 = map->size_pixels;
+        map->dirty_x1 = map->dirty_y1 = -1;
+    }
+    
+    return count;
 }
 
 void map_string(
@@ -627,7 +781,7 @@ void
                 value = NO_OBSTACLE;
             }
             
-            map_laser_ray(map->pixels, map->size_pixels, x1, y1, x2, y2, xp, yp, value, q);
+            map_laser_ray(map, x1, y1, x2, y2, xp, yp, value, q);
         }
     }
 }
@@ -645,6 +799,66 @@ void
 }
 
 
+void
+        map_downsample(
+        map_t * fine,
+        map_t * coarse,
+        int x0,
+        int y0,
+        int x1,
+        int y1)
+{
+    int factor = fine->size_pixels / coarse->size_pixels;
+    int cx, cy, x, y;
+    
+    for (cy = y0 / factor; cy < (y1 + factor - 1) / factor; ++cy)
+    {
+        for (cx = x0 / factor; cx < (x1 + factor - 1) / factor; ++cx)
+        {
+            pixel_t lowest = NO_OBSTACLE;
+            
+            for (y = cy * factor; y < (cy + 1) * factor; ++y)
+            {
+                pixel_t * row = fine->pixels + y * fine->size_pixels;
+                
+                for (x = cx * factor; x < (cx + 1) * factor; ++x)
+                {
+                    if (row[x] < lowest)
+                    {
+                        lowest = row[x];
+                    }
+                }
+            }
+            
+            coarse->pixels[cy * coarse->size_pixels + cx] = lowest;
+        }
+    }
+}
+
+
+void
+        map_get_region(
+        map_t * map,
+        char * bytes,
+        int x0,
+        int y0,
+        int x1,
+        int y1)
+{
+    int x, y;
+    for (y=y0; y<y1; ++y)
+    {
+        pixel_t * src = map->pixels + y * map->size_pixels;
+        char * dst = bytes + y * map->size_pixels;
+        
+        for (x=x0; x<x1; ++x)
+        {
+            dst[x] = src[x] >> 8;
+        }
+    }
+}
+
+
 void
         map_set(
         map_t * map,
@@ -656,6 +870,8 @@ void
         map->pixels[k] = bytes[k];
         map->pixels[k] <<= 8;
     }
+    
+    map_mark_all_dirty(map);
 }
 
 void scan_init(
@@ -790,6 +1006,23 @@ position_t
         double sigma_theta_degrees,
         int max_search_iter,
         void * randomizer)
+{
+    return rmhc_position_search_ex(start_pos, map, scan, sigma_xy_mm, sigma_theta_degrees, 
+        max_search_iter, 0, randomizer, NULL, NULL);
+}
+
+position_t
+        rmhc_position_search_ex(
+        position_t start_pos,
+        map_t * map,
+        scan_t * scan,
+        double sigma_xy_mm,
+        double sigma_theta_degrees,
+        int max_search_iter,
+        int max_stall_iter,
+        void * randomizer,
+        int * best_distance,
+        int * evaluations)
 {
     position_t currentpos = start_pos;
     position_t bestpos = start_pos;
@@ -801,8 +1034,10 @@ position_t
     int last_lowest_distance = current_distance;
     
     int counter = 0;
+    int stall = 0;
+    int evals = 1;
     
-    while (counter < max_search_iter)
+    while (counter < max_search_iter && (max_stall_iter <= 0 || stall < max_stall_iter))
     {
         currentpos = lastbestpos;
         
@@ -811,16 +1046,19 @@ position_t
         currentpos.theta_degrees = random_normal(randomizer, currentpos.theta_degrees, sigma_theta_degrees);
         
         current_distance = distance_scan_to_map(map, scan, currentpos);
+        evals++;
         
         /* -1 indicates infinity */
         if ((current_distance > -1) && (current_distance < lowest_distance))
         {
             lowest_distance = current_distance;
             bestpos = currentpos;
+            stall = 0;
         }
         else
         {
             counter++;
+            stall++;
         }
         
         if (counter > max_search_iter / 3)
@@ -837,5 +1075,15 @@ position_t
         
     }
     
+    if (best_distance)
+    {
+        *best_distance = lowest_distance;
+    }
+    
+    if (evaluations)
+    {
+        *evaluations = evals;
+    }
+    
     return bestpos;
 }
\ No newline at end of file
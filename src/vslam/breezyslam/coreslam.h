@@ -49,6 +49,13 @@ typedef struct map_t {
     double size_meters;
     
     double scale_pixels_per_mm;
+
+    /* Pixels written since the dirty state was last reset: tile bitmap and bounding box */
+    unsigned char * dirty_tiles;
+    int dirty_tile_shift;               /* tile side is 1 << dirty_tile_shift pixels */
+    int dirty_tiles_per_row;
+    int dirty_x0, dirty_y0;             /* bounding box, empty when dirty_x0 > dirty_x1 */
+    int dirty_x1, dirty_y1;             /* inclusive */
     
 } map_t;
 
@@ -152,6 +159,40 @@ void
 map_set(
     map_t * map, 
     char * bytes);
+
+/* Marks every tile of the map as dirty */
+void
+map_mark_all_dirty(
+    map_t * map);
+
+/* Stores indices (row * dirty_tiles_per_row + col) of dirty tiles into tiles, which must hold
+   dirty_tiles_per_row^2 ints, and returns their count; clears the dirty state if reset is nonzero */
+int
+map_get_dirty_tiles(
+    map_t * map,
+    int * tiles,
+    int reset);
+
+/* Sets every pixel of coarse covering the fine region x0 <= x < x1, y0 <= y < y1 to the minimum
+   (most obstacle-like) of the fine pixels under it; fine size must be a multiple of coarse size */
+void
+map_downsample(
+    map_t * fine,
+    map_t * coarse,
+    int x0,
+    int y0,
+    int x1,
+    int y1);
+
+/* Copies pixels with x0 <= x < x1, y0 <= y < y1 into the same positions of a full-size byte map */
+void
+map_get_region(
+    map_t * map, 
+    char * bytes,
+    int x0,
+    int y0,
+    int x1,
+    int y1);
     
 /* Returns -1 for infinity */
 int 
@@ -172,6 +213,22 @@ rmhc_position_search(
 	int max_search_iter,
 	void * randomizer);
 
+/* Random-Mutation Hill-Climbing search which also stops after max_stall_iter consecutive candidates
+   without improvement (0 for no limit). Stores the distance at the returned position in best_distance
+   and the number of candidates tried in evaluations, either may be NULL. */
+position_t 
+rmhc_position_search_ex(
+    position_t start_pos,
+	map_t * map,
+    scan_t * scan,
+	double sigma_xy_mm,
+	double sigma_theta_degrees,
+	int max_search_iter,
+	int max_stall_iter,
+	void * randomizer,
+	int * best_distance,
+	int * evaluations);
+
 #ifdef __cplusplus 
 }
 #endif
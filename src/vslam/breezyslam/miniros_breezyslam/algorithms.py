@@ -23,6 +23,7 @@ import miniros_breezyslam_cpack as pybreezyslam
 
 import math
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Basic params
 _DEFAULT_MAP_QUALITY         = 50 # out of 255
@@ -83,6 +84,9 @@ class CoreSLAM(object):
                 
         # Initialize the map 
         self.map = pybreezyslam.Map(map_size_pixels, map_size_meters)
+
+        # Tiles changed since each consumer's last get_dirty_tiles() call
+        self._dirty_tiles = {}
                 
     def update(self, scans_mm, pose_change, scan_angles_degrees=None, should_update_map=True):
         '''
@@ -111,16 +115,49 @@ class CoreSLAM(object):
         
     def getmap(self, mapbytes):
         '''
-        Fills bytearray mapbytes with current map pixels, where bytearray length is square of map size passed
-        to CoreSLAM.__init__().
+        Fills mapbytes with current map pixels, where mapbytes is a writable buffer (bytearray, mmap,
+        numpy array) whose length is square of map size passed to CoreSLAM.__init__().
         '''
         self.map.get(mapbytes)
+
+    def get_dirty_tiles(self, consumer='default'):
+        '''
+        Returns map tiles changed since the previous call with the same consumer name, as a sorted list
+        of pixel regions (x0, y0, x1, y1) usable with map.get(). The first call of a consumer returns
+        every tile.
+        '''
+        tiles = self.map.dirty_tiles()
+        for pending in self._dirty_tiles.values():
+            pending.update(tiles)
+
+        if consumer not in self._dirty_tiles:
+            self._dirty_tiles[consumer] = set()
+            return self.map.dirty_tiles(reset=False, all=True)
+
+        pending, self._dirty_tiles[consumer] = self._dirty_tiles[consumer], set()
+        return sorted(pending)
+
+    def getmap_dirty(self, mapbytes):
+        '''
+        Copies into mapbytes only the tiles changed since the previous call, so mapbytes must be the
+        same buffer every time. Returns the bounding box (x0, y0, x1, y1) of the copied tiles, or None
+        if the map has not changed.
+        '''
+        tiles = self.get_dirty_tiles('getmap')
+        if not tiles:
+            return None
+
+        for tile in tiles:
+            self.map.get(mapbytes, *tile)
+
+        return (min(t[0] for t in tiles), min(t[1] for t in tiles), 
+                max(t[2] for t in tiles), max(t[3] for t in tiles))
         
         
     def setmap(self, mapbytes):
         '''
-        Sets current map pixels to values in bytearray, where bytearray length is square of map size passed
-        to CoreSLAM.__init__().
+        Sets current map pixels to values in mapbytes, where mapbytes is a buffer (bytes, bytearray, mmap,
+        numpy array) whose length is square of map size passed to CoreSLAM.__init__().
         '''
         self.map.set(mapbytes)
 
@@ -222,7 +259,7 @@ class RMHC_SLAM(SinglePositionSLAM):
     def __init__(self, laser, map_size_pixels, map_size_meters, 
                 map_quality=_DEFAULT_MAP_QUALITY, hole_width_mm=_DEFAULT_HOLE_WIDTH_MM,
                 random_seed=None, sigma_xy_mm=_DEFAULT_SIGMA_XY_MM, sigma_theta_degrees=_DEFAULT_SIGMA_THETA_DEGREES, 
-                max_search_iter=_DEFAULT_MAX_SEARCH_ITER):
+                max_search_iter=_DEFAULT_MAX_SEARCH_ITER, search_threads=1, max_stall_iter=0):
         '''
         Creates a RMHCSlam object suitable for updating with new Lidar and odometry data.
         laser is a Laser object representing the specifications of your Lidar unit
@@ -236,6 +273,10 @@ class RMHC_SLAM(SinglePositionSLAM):
         sigma_theta_degrees specifies the standard deviation in degrees of the normal distribution of 
            the rotational component of position for RMHC search
         max_search_iter specifies the maximum number of iterations for RMHC search
+        search_threads specifies the number of independent RMHC chains run in parallel threads, each with
+           its own random stream; the chain ending at the position closest to the map wins
+        max_stall_iter ends a search early after that many consecutive candidates without improvement;
+           0 disables the limit
         '''
     
         SinglePositionSLAM.__init__(self, laser, map_size_pixels, map_size_meters, 
@@ -245,10 +286,19 @@ class RMHC_SLAM(SinglePositionSLAM):
             random_seed = int(time.time()) & 0xFFFF
             
         self.randomizer = pybreezyslam.Randomizer(random_seed)
+
+        # Extra chains get their own randomizers; the C search releases the GIL so they run in parallel
+        self.search_randomizers = [self.randomizer] + \
+            [pybreezyslam.Randomizer((random_seed + k) & 0xFFFF) for k in range(1, search_threads)]
+        self.search_executor = ThreadPoolExecutor(search_threads - 1) if search_threads > 1 else None
         
         self.sigma_xy_mm = sigma_xy_mm
         self.sigma_theta_degrees = sigma_theta_degrees
         self.max_search_iter = max_search_iter
+        self.max_stall_iter = max_stall_iter
+
+        # Statistics of the latest position search: candidates evaluated, final scan-to-map distance, time
+        self.last_stats = {'evaluations': 0, 'distance': -1, 'search_seconds': 0.}
         
     def update(self, scans_mm, pose_change=None, scan_angles_degrees=None, should_update_map=True):
 
@@ -264,21 +314,115 @@ class RMHC_SLAM(SinglePositionSLAM):
         search to look for a better position based on a starting position.
         '''     
         
-        # RMHC search is implemented as a C extension for efficiency
-        return pybreezyslam.rmhcPositionSearch(
+        start_time = time.perf_counter()
+
+        if self.search_executor is None:
+            results = [self._search(start_position, self.randomizer)]
+
+        else:
+            # Run one chain in this thread and the others in the pool
+            chains = [self.search_executor.submit(self._search, start_position, randomizer) 
+                      for randomizer in self.search_randomizers[1:]]
+            results = [self._search(start_position, self.randomizer)] + [chain.result() for chain in chains]
+
+        best_position, best_distance = start_position, -1
+        for position, distance, _ in results:
+
+            # -1 indicates infinity
+            if distance > -1 and (best_distance == -1 or distance < best_distance):
+                best_position, best_distance = position, distance
+
+        self.last_stats = {'evaluations': sum(result[2] for result in results), 'distance': best_distance,
+                           'search_seconds': time.perf_counter() - start_time}
+
+        return best_position
+
+    def _search(self, start_position, randomizer, level_map=None, sigma_xy_mm=None, sigma_theta_degrees=None, 
+                max_search_iter=None):
+
+        # RMHC search is implemented as a C extension for efficiency; returns (position, distance, evaluations)
+        return pybreezyslam.rmhcPositionSearchEx(
             start_position, 
-            self.map, 
+            self.map if level_map is None else level_map, 
             self.scan_for_distance, 
             self.laser,
-            self.sigma_xy_mm,
-            self.sigma_theta_degrees,
-            self.max_search_iter,
-            self.randomizer)
+            self.sigma_xy_mm if sigma_xy_mm is None else sigma_xy_mm,
+            self.sigma_theta_degrees if sigma_theta_degrees is None else sigma_theta_degrees,
+            self.max_search_iter if max_search_iter is None else max_search_iter,
+            self.max_stall_iter,
+            randomizer)
                              
     def _random_normal(self, mu, sigma):
         
         return mu + self.randomizer.rnor() * sigma
 
+# MultiScaleRMHC_SLAM class -------------------------------------------------------------------------------------------
+
+class MultiScaleRMHC_SLAM(RMHC_SLAM):
+    '''
+    MultiScaleRMHC_SLAM implements the _getNewPosition() method of SinglePositionSLAM with coarse-to-fine 
+    Random-Mutation Hill-Climbing search. Downsampled copies of the map, where every pixel keeps the most
+    obstacle-like value under it, are searched first with wide sigmas; each result seeds a narrower search
+    on the next finer level, ending on the full map.
+    '''
+
+    def __init__(self, laser, map_size_pixels, map_size_meters, 
+                map_quality=_DEFAULT_MAP_QUALITY, hole_width_mm=_DEFAULT_HOLE_WIDTH_MM,
+                random_seed=None, levels=((8, 400, 20, 200), (1, 50, 5, 200)), max_stall_iter=0):
+        '''
+        Creates a MultiScaleRMHC_SLAM object suitable for updating with new Lidar and odometry data.
+        laser is a Laser object representing the specifications of your Lidar unit
+        map_size_pixels is the size of the square map in pixels
+        map_size_meters is the size of the square map in meters
+        quality from 0 through 255 determines integration speed of scan into map
+        hole_width_mm determines width of obstacles (walls)
+        random_seed supports reproducible results; defaults to system time if unspecified
+        levels is a sequence of (downsampling factor, sigma_xy_mm, sigma_theta_degrees, max_search_iter), 
+           searched in order; map_size_pixels must be a multiple of every factor, and factor 1 is the map itself
+        max_stall_iter ends each level's search early after that many consecutive candidates without improvement
+        '''
+
+        _, sigma_xy_mm, sigma_theta_degrees, max_search_iter = levels[0]
+
+        RMHC_SLAM.__init__(self, laser, map_size_pixels, map_size_meters, 
+            map_quality, hole_width_mm, random_seed, sigma_xy_mm, sigma_theta_degrees, max_search_iter,
+            max_stall_iter=max_stall_iter)
+
+        self.levels = levels
+        self.level_maps = [self.map if factor == 1 else pybreezyslam.Map(map_size_pixels // factor, map_size_meters) 
+                           for factor, _, _, _ in levels]
+
+    def _update_level_maps(self):
+
+        # Only tiles changed since the previous search are pooled again
+        tiles = self.get_dirty_tiles('levels')
+
+        for level_map in self.level_maps:
+            if level_map is not self.map:
+                for tile in tiles:
+                    self.map.downsample(level_map, *tile)
+
+    def _getNewPosition(self, start_position):
+        '''
+        Implements the _getNewPosition() method of SinglePositionSLAM. Runs RMHC search on each level,
+        starting from the result of the previous one.
+        '''
+
+        start_time = time.perf_counter()
+
+        self._update_level_maps()
+
+        position, evaluations = start_position, 0
+        for (_, sigma_xy_mm, sigma_theta_degrees, max_search_iter), level_map in zip(self.levels, self.level_maps):
+            position, distance, level_evaluations = self._search(position, self.randomizer, level_map, 
+                                                                 sigma_xy_mm, sigma_theta_degrees, max_search_iter)
+            evaluations += level_evaluations
+
+        self.last_stats = {'evaluations': evaluations, 'distance': distance, 
+                           'search_seconds': time.perf_counter() - start_time}
+
+        return position
+
  # Deterministic_SLAM class  ------------------------------------------------------------------------------------        
 
 class Deterministic_SLAM(SinglePositionSLAM):
@@ -2,7 +2,7 @@
 BreezySLAM: Simple, efficient SLAM in Python
 
 vehicles.py: odometry models for different kinds of vehicles
-(currently just wheeled vehicles)
+(wheeled and tracked vehicles)
 
 Copyright (C) 2014 Suraj Bajracharya and Simon D. Levy
 
@@ -80,10 +80,11 @@ class WheeledVehicle(object):
             leftDiffDegrees = leftWheelDegreesCurr - self.leftWheelDegreesPrev
             rightDiffDegrees = rightWheelDegreesCurr - self.rightWheelDegreesPrev
             
+            # Forward distance is the mean of the wheel distances, rotation their difference over the axle
             dxyMillimeters =  self.wheelRadiusMillimeters * \
-                    (math.radians(leftDiffDegrees) + math.radians(rightDiffDegrees))
+                    (math.radians(leftDiffDegrees) + math.radians(rightDiffDegrees)) / 2
                
-            dthetaDegrees =  (float(self.wheelRadiusMillimeters) / self.halfAxleLengthMillimeters) * \
+            dthetaDegrees =  (float(self.wheelRadiusMillimeters) / (2 * self.halfAxleLengthMillimeters)) * \
                     (rightDiffDegrees - leftDiffDegrees)
                 
             dtSeconds = timestampSecondsCurr - self.timestampSecondsPrev
@@ -95,3 +96,63 @@ class WheeledVehicle(object):
 
         # Return linear velocity, angular velocity, time difference
         return dxyMillimeters, dthetaDegrees, dtSeconds 
+
+
+class TrackedVehicle(WheeledVehicle):
+    '''
+    Odometry for tracked robots from track speeds, commanded or measured, in RPM of the drive wheels.
+    Speeds are integrated into drive wheel angles, each speed being held until the next one is set:
+    
+      vehicle.setSpeeds(timestampSeconds, leftTrackRPM, rightTrackRPM)   whenever the speeds change
+      vehicle.poseChange(timestampSeconds)                               once per scan
+    '''
+    
+    def __init__(self, driveWheelRadiusMillimeters, trackWidthMillimeters):
+        '''
+        driveWheelRadiusMillimeters radius of the wheels driving the tracks
+        trackWidthMillimeters       distance between the tracks
+        '''
+        WheeledVehicle.__init__(self, driveWheelRadiusMillimeters, trackWidthMillimeters / 2.)
+        
+        self.timestampSecondsLast = None
+        self.leftTrackRPM = 0
+        self.rightTrackRPM = 0
+        self.leftTrackDegrees = 0
+        self.rightTrackDegrees = 0
+        
+    def setSpeeds(self, timestampSeconds, leftTrackRPM, rightTrackRPM):
+        '''
+        Integrates the previous speeds up to timestampSeconds and switches to the new ones.
+        '''
+        self._integrate(timestampSeconds)
+        
+        self.leftTrackRPM = leftTrackRPM
+        self.rightTrackRPM = rightTrackRPM
+        
+    def poseChange(self, timestampSeconds):
+        '''
+        Returns a tuple (dxyMillimeters, dthetaDegrees, dtSeconds) since the previous call, 
+        assuming the current speeds have been held until timestampSeconds.
+        '''
+        return self.computePoseChange(timestampSeconds, self.leftTrackRPM, self.rightTrackRPM)
+        
+    def extractOdometry(self, timestamp, leftWheel, rightWheel):
+        
+        self.setSpeeds(timestamp, leftWheel, rightWheel)
+        
+        return self.timestampSecondsLast, self.leftTrackDegrees, self.rightTrackDegrees
+        
+    def _integrate(self, timestampSeconds):
+        
+        if self.timestampSecondsLast != None:
+        
+            # Out-of-order timestamps add nothing
+            dtSeconds = max(0, timestampSeconds - self.timestampSecondsLast)
+            
+            # RPM => degrees per second
+            self.leftTrackDegrees += self.leftTrackRPM * 6 * dtSeconds
+            self.rightTrackDegrees += self.rightTrackRPM * 6 * dtSeconds
+            
+            timestampSeconds = max(timestampSeconds, self.timestampSecondsLast)
+            
+        self.timestampSecondsLast = timestampSeconds
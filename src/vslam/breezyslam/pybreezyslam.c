@@ -442,17 +442,20 @@ typedef struct
     
 } Map;
 
-// Helper for Map.__init__(), Map.set()
-static int bad_mapbytes(PyObject * py_mapbytes, int size_pixels, const char * methodname)
+// Helper for Map.__init__(), Map.get(), Map.set()
+// Accepts any C-contiguous buffer (bytearray, mmap, numpy array); release the view with PyBuffer_Release
+static int bad_mapbytes(PyObject * py_mapbytes, Py_buffer * view, int size_pixels, int writable, const char * methodname)
 {    
-    if (!PyByteArray_Check(py_mapbytes))
+    if (PyObject_GetBuffer(py_mapbytes, view, PyBUF_C_CONTIGUOUS | (writable ? PyBUF_WRITABLE : 0)))
     {
+        PyErr_Clear();
         return error_on_raise_argument_exception_with_details("Map", methodname, 
-            "argument is not a byte array");        
+            writable ? "argument is not a writable contiguous buffer" : "argument is not a contiguous buffer");        
     }
     
-    if (PyByteArray_GET_SIZE(py_mapbytes) != (size_pixels * size_pixels))
+    if (view->len != (Py_ssize_t)size_pixels * size_pixels)
     {        
+        PyBuffer_Release(view);
         return error_on_raise_argument_exception_with_details("Map", methodname, 
             "mapbytes are wrong size");
     }
@@ -497,9 +500,17 @@ Map_init(Map *self, PyObject *args, PyObject *kwds)
            
     map_init(&self->map, size_pixels, size_meters);
     
-    if (py_bytes && !bad_mapbytes(py_bytes, size_pixels, "__init__"))
+    if (py_bytes)
     {    
-        map_set(&self->map, PyByteArray_AsString(py_bytes));
+        Py_buffer view;
+
+        if (bad_mapbytes(py_bytes, &view, size_pixels, 0, "__init__"))
+        {
+            return -1;
+        }
+
+        map_set(&self->map, (char *)view.buf);
+        PyBuffer_Release(&view);
     }
     
     return 0;
@@ -521,18 +532,35 @@ static PyObject *
 Map_get(Map * self, PyObject * args, PyObject * kwds)
 {        
     PyObject * py_mapbytes = NULL;
+    Py_buffer view;
+    int size = self->map.size_pixels;
+    int x0 = 0, y0 = 0, x1 = size, y1 = size;
 
-    if (!PyArg_ParseTuple(args, "O", &py_mapbytes))
+    if (!PyArg_ParseTuple(args, "O|iiii", &py_mapbytes, &x0, &y0, &x1, &y1))
     {
         return null_on_raise_argument_exception("Map", "get");
     }
     
-    if (bad_mapbytes(py_mapbytes, self->map.size_pixels, "get"))
+    if (bad_mapbytes(py_mapbytes, &view, size, 1, "get"))
     {
-        Py_RETURN_NONE;
+        return NULL;
     }
+
+    /* Clip the region to the map */
+    x0 = x0 < 0 ? 0 : x0;
+    y0 = y0 < 0 ? 0 : y0;
+    x1 = x1 > size ? size : x1;
+    y1 = y1 > size ? size : y1;
     
-    map_get(&self->map, PyByteArray_AsString(py_mapbytes));
+    if (x0 == 0 && y0 == 0 && x1 == size && y1 == size)
+    {
+        map_get(&self->map, (char *)view.buf);
+    }
+    else
+    {
+        map_get_region(&self->map, (char *)view.buf, x0, y0, x1, y1);
+    }
+    PyBuffer_Release(&view);
     
     Py_RETURN_NONE;
 }
@@ -541,22 +569,116 @@ static PyObject *
 Map_set(Map * self, PyObject * args, PyObject * kwds)
 {        
     PyObject * py_mapbytes = NULL;
+    Py_buffer view;
 
     if (!PyArg_ParseTuple(args, "O", &py_mapbytes))
     {
-        return null_on_raise_argument_exception("Map", "get");
+        return null_on_raise_argument_exception("Map", "set");
+    }
+    
+    if (bad_mapbytes(py_mapbytes, &view, self->map.size_pixels, 0, "set"))
+    {
+        return NULL;
+    }
+    
+    map_set(&self->map, (char *)view.buf);
+    PyBuffer_Release(&view);
+    
+    Py_RETURN_NONE;
+}
+
+static PyTypeObject pybreezyslam_MapType;
+
+static PyObject *
+Map_downsample(Map * self, PyObject * args, PyObject * kwds)
+{        
+    Map * py_coarse = NULL;
+    int size = self->map.size_pixels;
+    int x0 = 0, y0 = 0, x1 = size, y1 = size;
+
+    if (!PyArg_ParseTuple(args, "O|iiii", &py_coarse, &x0, &y0, &x1, &y1))
+    {
+        return null_on_raise_argument_exception("Map", "downsample");
+    }
+    
+    if (error_on_check_argument_type((PyObject *)py_coarse, &pybreezyslam_MapType, 0,
+            "pybreezyslam.Map", "Map", "downsample"))
+    {
+        return NULL;
     }
     
-    if (bad_mapbytes(py_mapbytes, self->map.size_pixels, "get"))
+    int coarse_size = py_coarse->map.size_pixels;
+    
+    if (coarse_size <= 0 || coarse_size > size || size % coarse_size)
     {
-        Py_RETURN_NONE;
+        return null_on_raise_argument_exception_with_details("Map", "downsample",
+            "map size must be a multiple of coarse map size");
     }
     
-    map_set(&self->map, PyByteArray_AsString(py_mapbytes));
+    /* Clip the region to the map */
+    x0 = x0 < 0 ? 0 : x0;
+    y0 = y0 < 0 ? 0 : y0;
+    x1 = x1 > size ? size : x1;
+    y1 = y1 > size ? size : y1;
+    
+    if (x0 < x1 && y0 < y1)
+    {
+        map_downsample(&self->map, &py_coarse->map, x0, y0, x1, y1);
+    }
     
     Py_RETURN_NONE;
 }
 
+static PyObject *
+Map_dirty_tiles(Map * self, PyObject * args, PyObject * kwds)
+{        
+    int reset = 1;
+    int all = 0;
+    
+    static char * argnames[] = {"reset", "all", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|pp", argnames, &reset, &all))
+    {
+        return null_on_raise_argument_exception("Map", "dirty_tiles");
+    }
+    
+    int tiles_per_row = self->map.dirty_tiles_per_row;
+    int tile = 1 << self->map.dirty_tile_shift;
+    int size = self->map.size_pixels;
+    
+    int * tiles = (int *)malloc(tiles_per_row * tiles_per_row * sizeof(int));
+    if (!tiles)
+    {
+        return PyErr_NoMemory();
+    }
+    
+    int count = map_get_dirty_tiles(&self->map, tiles, reset);
+    
+    if (all)
+    {
+        for (count = 0; count < tiles_per_row * tiles_per_row; ++count)
+        {
+            tiles[count] = count;
+        }
+    }
+    
+    PyObject * py_tiles = PyList_New(count);
+    int k;
+    for (k = 0; py_tiles && k < count; ++k)
+    {
+        int x0 = (tiles[k] % tiles_per_row) * tile;
+        int y0 = (tiles[k] / tiles_per_row) * tile;
+        
+        PyList_SET_ITEM(py_tiles, k, Py_BuildValue("(iiii)", x0, y0, 
+            x0 + tile < size ? x0 + tile : size, 
+            y0 + tile < size ? y0 + tile : size));
+    }
+    
+    free(tiles);
+    
+    return py_tiles;
+}
+
 static PyObject *
 Map_update(Map *self, PyObject *args, PyObject *kwds)
 {   
@@ -602,10 +724,20 @@ static PyMethodDef Map_methods[] =
     "Hole width determines width of obstacles (walls)."
     },
     {"get", (PyCFunction)Map_get, METH_VARARGS,
-    "Map.get(bytearray) fills byte array with map pixels, where bytearray length is square of size of map."
+    "Map.get(buffer, x0=0, y0=0, x1=size, y1=size) fills a writable buffer (bytearray, mmap, numpy array) with map pixels, where buffer length is square of size of map.\n"\
+    "Only pixels with x0 <= x < x1, y0 <= y < y1 are copied, the rest of the buffer is left as is."
+    },
+    {"downsample", (PyCFunction)Map_downsample, METH_VARARGS,
+    "Map.downsample(coarse, x0=0, y0=0, x1=size, y1=size) sets the pixels of the smaller Map coarse covering the region\n"\
+    "x0 <= x < x1, y0 <= y < y1 of this map to the minimum (most obstacle-like) of the pixels under them.\n"\
+    "The size of this map must be a multiple of the size of coarse."
+    },
+    {"dirty_tiles", (PyCFunction)Map_dirty_tiles, METH_VARARGS | METH_KEYWORDS,
+    "Map.dirty_tiles(reset=True, all=False) returns tiles written by Map.update() or Map.set() since the last reset,\n"\
+    "as a list of pixel regions (x0, y0, x1, y1) usable with Map.get(). all=True returns every tile of the map."
     },
     {"set", (PyCFunction)Map_set, METH_VARARGS,
-    "Map.set(bytearray) fills current map with pixels in bytearray, where bytearray length is square of size of map."
+    "Map.set(buffer) fills current map with pixels in a buffer (bytes, bytearray, mmap, numpy array), where buffer length is square of size of map."
     },
     {NULL}  // Sentinel 
 };
@@ -822,7 +954,13 @@ rmhcPositionSearch(PyObject *self, PyObject *args)
     // Convert Python objects to C structures
     position_t start_pos = pypos2cpos(py_start_pos);
 
-	position_t likeliest_position = 
+    // The search only reads the map and scan and only writes the randomizer state, so other
+    // searches (with their own randomizers) can run in parallel threads
+    position_t likeliest_position;
+
+    Py_BEGIN_ALLOW_THREADS
+
+	likeliest_position = 
     rmhc_position_search(
         start_pos,
         &py_map->map,
@@ -831,6 +969,8 @@ rmhcPositionSearch(PyObject *self, PyObject *args)
         sigma_theta_degrees,
         max_search_iter,
         py_randomizer->randomizer);    
+
+    Py_END_ALLOW_THREADS
     
     
     // Convert C position back to Python object
@@ -846,6 +986,73 @@ rmhcPositionSearch(PyObject *self, PyObject *args)
     
 }
 
+// Called internally, so minimal type-checking on arguments
+static PyObject *
+rmhcPositionSearchEx(PyObject *self, PyObject *args)
+{   	    
+    Position * py_start_pos = NULL;
+	Map * py_map = NULL;
+    Scan * py_scan = NULL;
+    PyObject * py_laser = NULL;
+	double sigma_xy_mm = 0;
+	double sigma_theta_degrees = 0;
+	int max_search_iter = 0;
+	int max_stall_iter = 0;
+	Randomizer * py_randomizer = NULL;
+	
+    if (!PyArg_ParseTuple(args, "OOOOddiiO", 
+        &py_start_pos,
+        &py_map,
+        &py_scan,
+        &py_laser,
+        &sigma_xy_mm,
+        &sigma_theta_degrees,
+        &max_search_iter,
+        &max_stall_iter,
+        &py_randomizer))
+    {        
+        return null_on_raise_argument_exception("breezyslam.algorithms", "rmhcPositionSearchEx");
+    }
+    
+    position_t start_pos = pypos2cpos(py_start_pos);
+
+    position_t likeliest_position;
+    int best_distance = -1;
+    int evaluations = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+
+	likeliest_position = 
+    rmhc_position_search_ex(
+        start_pos,
+        &py_map->map,
+        &py_scan->scan,
+        sigma_xy_mm,
+        sigma_theta_degrees,
+        max_search_iter,
+        max_stall_iter,
+        py_randomizer->randomizer,
+        &best_distance,
+        &evaluations);    
+
+    Py_END_ALLOW_THREADS
+    
+    PyObject * argList = Py_BuildValue("ddd", 
+        likeliest_position.x_mm, 
+        likeliest_position.y_mm, 
+        likeliest_position.theta_degrees); 
+    PyObject * py_likeliest_position = 
+    PyObject_CallObject((PyObject *) &pybreezyslam_PositionType, argList);
+    Py_DECREF(argList);	
+    
+    if (py_likeliest_position == NULL)
+    {
+        return NULL;
+    }
+    
+    return Py_BuildValue("Nii", py_likeliest_position, best_distance, evaluations);
+}
+
 
 static PyMethodDef module_methods[] = 
 {
@@ -861,6 +1068,12 @@ static PyMethodDef module_methods[] =
         "rmhcPositionSearch(startpos, map, scan, laser, sigma_xy_mm, max_iter, randomizer)\n"
     "Internal use only."
     },
+    {"rmhcPositionSearchEx", rmhcPositionSearchEx, METH_VARARGS,
+        "rmhcPositionSearchEx(startpos, map, scan, laser, sigma_xy_mm, sigma_theta_degrees, max_iter, max_stall_iter, randomizer)\n"
+    "Like rmhcPositionSearch, also stopping after max_stall_iter candidates without improvement (0 for no limit).\n"\
+    "Returns (position, distance, evaluations).\n"\
+    "Internal use only."
+    },
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -2,58 +2,209 @@ from miniros import AsyncROSClient
 from miniros.util.decorators import decorators
 from miniros.util.datatypes import Vector
 from miniros.util.util import Ticker
-from miniros_vslam.source.datatypes import SLAMMap, SLAMPosition, SLAMAnonSave, SLAMAnonLoad
+from miniros_vslam.source.datatypes import SLAMMap, SLAMMapDelta, SLAMPosition, SLAMAnonSave, SLAMAnonLoad
+from miniros_vslam.source.mapdelta import MapDeltaEncoder
+import miniros_vslam.source.mapfile as mapfile
+from miniros_vslam.source.mapstore import MapStore
+from miniros_vslam.source.frontend import ScanDecimator
+from miniros_vslam.source.scanlog import ScanWriter
 import miniros_breezyslam.algorithms as algos
 import miniros_breezyslam.sensors as sensors
+import miniros_breezyslam.vehicles as vehicles
 import miniros_vlidar.source.datatypes as vlidar_datatypes
+from miniros_vmovement.source.datatypes import TrackSpeeds
 import asyncio
+import time
 
 
 MAP_SIZE_PX = 4000
 MAP_SIZE_MET = 40
 
+# default track geometry, same as DRIVE_WHEEL_RADIUS and TRACKS_SPACE of the motor controller (motors.py)
+DRIVE_WHEEL_RADIUS_MM = 20
+TRACK_WIDTH_MM = 140
+ODOMETRY_TIMEOUT = 1 # s without track speeds after which scans are matched without odometry
+
+# RMHC search (sigma xy mm, sigma theta degrees, max iterations, max iterations without improvement, 0 for no limit)
+# without and with odometry; a stall limit costs the wide blind search accuracy
+SEARCH_BLIND = (100, 20, 1000, 0)
+SEARCH_ODOMETRY = (40, 6, 400, 150)
+
+STATS_INTERVAL = 10 # s between stats lines in the log
+
 
 class VSLAMClient(AsyncROSClient):
-    def __init__(self, ip = "localhost", port = 3000):
+    def __init__(self, ip = "localhost", port = 3000, compress_map = True, storage = "memory", map_path = "maps/live.vmm", record_path = None,
+                 drive_wheel_radius_mm = DRIVE_WHEEL_RADIUS_MM, track_width_mm = TRACK_WIDTH_MM):
         super().__init__("vslam", ip, port)
 
+        self.compress_map = compress_map # send the full map topic as a compressed map file
+
         self.slam = algos.RMHC_SLAM(
             sensors.RPLidarA1(),
             MAP_SIZE_PX,
             MAP_SIZE_MET
         )
 
-        self.map = bytearray(MAP_SIZE_PX ** 2)
+        # odometry from track speeds, the geometry has to match the robot or every pose change is scaled wrong
+        self.odometry = vehicles.TrackedVehicle(drive_wheel_radius_mm, track_width_mm)
+        self.odometry_time = None # when track speeds were last received
+        self.odometry_moving = False # a nonzero speed was received, before that zeros only mean nothing commands the tracks
+        self.decimator = ScanDecimator()
+        self.update_seconds = 0. # total time spent in SLAM updates
+        self.evaluations = 0 # total RMHC candidate poses scored
+        self.stats_time = time.monotonic()
+        self.stats_last = self.stats()
+
+        # raw scans are logged to record_path for offline replay (bench/replay.py)
+        self.recorder = ScanWriter(record_path) if record_path is not None else None
+
+        self.map_delta = MapDeltaEncoder(MAP_SIZE_PX)
+        self.map_changed = None # region of self.map changed since the last published delta
         self.pos = (0, 0, 0)
 
+        # "mmap" keeps the live map in map_path, where other local processes can read it with MapStore
+        self.store = None
+        if storage == "mmap":
+            self.store = MapStore(map_path, MAP_SIZE_PX)
+            self.map = self.store.buffer
+
+            if self.store.seq > 0: # continue the map left by the previous run
+                self._set_map(self.store.buffer, self.store.pose)
+        else:
+            self.map = bytearray(MAP_SIZE_PX ** 2)
+
+
+    def _get_map(self) -> tuple[slice, slice] | None:
+        """
+        Copies the part of the SLAM map changed since the last call into self.map in place
+
+        The copied region is accumulated in map_changed until the next map publish,
+        returns it as (rows, cols) slices, None if nothing changed
+        """
+        if self.store is None:
+            region = self.slam.getmap_dirty(self.map)
+        else:
+            with self.store.writing(self.slam.getpos()) as buffer:
+                region = self.slam.getmap_dirty(buffer)
+
+        if region is None:
+            return None
+
+        x0, y0, x1, y1 = region
+        if self.map_changed is not None:
+            rows, cols = self.map_changed
+            x0, y0, x1, y1 = min(x0, cols.start), min(y0, rows.start), max(x1, cols.stop), max(y1, rows.stop)
+
+        self.map_changed = (slice(y0, y1), slice(x0, x1))
+        return self.map_changed
+
+
+    def _set_map(self, mapdata, pose):
+        self.slam.setmap(mapdata)
+        if pose is not None:
+            self.slam.position.x_mm, self.slam.position.y_mm, self.slam.position.theta_degrees = pose
+            self.pos = pose
+
 
     @decorators.aparsedata(SLAMAnonSave)
     async def on_save(self, data: int, field: str):
-        self.slam.getmap(self.map)
-        with open(f"maps/{data}.map", "wb") as f:
-            f.write(self.map)
+        self._get_map()
+
+        if self.store is not None:
+            self.store.save(f"maps/{data}.vmm")
+        else:
+            mapfile.save(f"maps/{data}.map", self.map, MAP_SIZE_MET, self.slam.getpos())
 
 
     @decorators.aparsedata(SLAMAnonLoad)
     async def on_read(self, data: int, field: str):
         try:
-            with open(f"maps/{data}.map", "rb") as f:
-                data = f.read()
-                if len(data) != MAP_SIZE_PX ** 2: return
-                self.map = data
-                self.slam.setmap(data)
-        except: pass
+            # maps saved in mmap storage are paged in by setmap instead of being read whole
+            saved = MapStore(f"maps/{data}.vmm", MAP_SIZE_PX, readonly=True)
+        except (OSError, ValueError):
+            saved = None
+
+        if saved is not None:
+            self._set_map(saved.buffer, saved.pose)
+            saved.close()
+        else:
+            try:
+                mapdata, pose = mapfile.load(f"maps/{data}.map", MAP_SIZE_PX)
+            except (OSError, ValueError): return
+
+            self._set_map(mapdata, pose)
+
+        self._get_map()
+
+
+    def stats(self) -> dict:
+        return {
+            "used": self.decimator.used,
+            "skipped": self.decimator.skipped,
+            "update_seconds": self.update_seconds,
+            "evaluations": self.evaluations,
+        }
+
+    def log_stats(self):
+        """Prints SLAM update rate, time and search effort since the previous call"""
+
+        now = time.monotonic()
+        stats = self.stats()
+        used = stats["used"] - self.stats_last["used"]
+
+        print(
+            f"{used / (now - self.stats_time):.1f} updates/s, "
+            f"{stats['skipped'] - self.stats_last['skipped']} scans skipped, "
+            f"{(stats['update_seconds'] - self.stats_last['update_seconds']) * 1000 / used if used else 0:.1f} ms/update, "
+            f"{(stats['evaluations'] - self.stats_last['evaluations']) / used if used else 0:.0f} evaluations/update"
+        )
+
+        self.stats_time, self.stats_last = now, stats
+
+
+    @decorators.aparsedata(TrackSpeeds)
+    async def on_vmovement_tracks(self, data: TrackSpeeds):
+        self.odometry_time = time.monotonic()
+        self.odometry.setSpeeds(self.odometry_time, data.left, data.right)
+        self.odometry_moving |= bool(data.left or data.right)
 
 
     @decorators.aparsedata(vlidar_datatypes.LidarData)
     async def on_vlidar_lidar(self, data: vlidar_datatypes.LidarData):
-        dist, ang = data.distances, data.angles
+        # vlidar runs on the same host, its monotonic scan end time is comparable to ours
+        now = data.t_end or time.monotonic()
+        if self.recorder is not None:
+            self.recorder.write(now, data.distances, data.angles)
+
+        pose_change = self.odometry.poseChange(now)
+
+        # stale speeds would drag the search start away, and zeros before any commanded motion
+        # may hide a robot driven by something else, match blind instead
+        if not self.odometry_moving or now - self.odometry_time > ODOMETRY_TIMEOUT:
+            pose_change = None
+
+        use, pose_change = self.decimator.accept(now, data.distances, data.angles, pose_change)
+        if not use: # standing still
+            return
+
+        self.slam.sigma_xy_mm, self.slam.sigma_theta_degrees, self.slam.max_search_iter, self.slam.max_stall_iter = \
+            SEARCH_BLIND if pose_change is None else SEARCH_ODOMETRY
+
+        # scans binned to one distance per laser step need no sorting and interpolation by angle
+        angles = None if data.binned and len(data.distances) == self.slam.laser.scan_size else data.angles.tolist()
+
+        update_start = time.perf_counter()
         self.slam.update(
-            dist,
-            scan_angles_degrees=ang,
+            data.distances.tolist(),
+            pose_change,
+            scan_angles_degrees=angles,
         )
 
-        self.slam.getmap(self.map)
+        self.update_seconds += time.perf_counter() - update_start
+        self.evaluations += self.slam.last_stats["evaluations"]
+
+        # the map is copied out only when it is published or saved
         self.pos = self.slam.getpos()
 
 
@@ -64,6 +215,7 @@ async def main():
         await client.wait()
 
         map_topic = await client.topic("map", SLAMMap)
+        mapdelta_topic = await client.topic("mapdelta", SLAMMapDelta)
         pos_topic = await client.topic("pos", SLAMPosition)
 
         ticker = Ticker(2)
@@ -71,9 +223,16 @@ async def main():
         while True:
             await ticker.tick_async()
 
-            await map_topic.post(
-                SLAMMap(client.map)
-            )
+            client._get_map()
+            changed, client.map_changed = client.map_changed or (slice(0, 0), slice(0, 0)), None
+            delta = client.map_delta.encode(client.map, changed)
+            await mapdelta_topic.post(delta)
+
+            # full map only for subscribers which don't assemble deltas
+            if delta.keyframe:
+                await map_topic.post(
+                    SLAMMap(client.map, client.compress_map, MAP_SIZE_MET, client.pos)
+                )
 
             x, y, theta = client.pos
             await pos_topic.post(
@@ -82,6 +241,13 @@ async def main():
                     Vector(0, theta, 0)
                 )
             )
+
+            # a killed run keeps its scans up to the last tick
+            if client.recorder is not None:
+                client.recorder.flush()
+
+            if time.monotonic() - client.stats_time >= STATS_INTERVAL:
+                client.log_stats()
     
     await asyncio.gather(
         client.run(),
@@ -1,22 +1,120 @@
 from miniros.util.datatypes import Datatype, Movement, Int, Vector
+import miniros_vslam.source.mapfile as mapfile
 import numpy as np
+import struct
 
 class SLAMMap(Datatype):
-    def __init__(self, mapdata: bytearray):
+    """
+    :param mapdata: raw map bytes
+    :param compressed: encode as a chunked map file (see `mapfile`) instead of raw bytes
+    :param size_meters: map side, m, stored in the compressed encoding
+    :param pose: robot pose, stored in the compressed encoding
+    """
+
+    def __init__(self, mapdata: bytearray, compressed: bool = False, size_meters: float = 0, pose = (0, 0, 0)):
         super().__init__()
-        self.data = mapdata
+        self._data = mapdata
+        self.compressed = compressed
+        self.size_meters = size_meters
+        self.pose = pose
+
+        self.file = None # mapfile.MapFile when decoded from the compressed encoding
+
+    @property
+    def data(self):
+        # compressed maps are only decompressed when the whole map is asked for
+        if self._data is None and self.file is not None:
+            self._data = self.file.read().reshape(-1).data
+        return self._data
+
+    @data.setter
+    def data(self, mapdata):
+        self._data = mapdata
 
     @staticmethod
     def encode(data: "SLAMMap"):
+        if data.compressed:
+            return mapfile.encode_map(data.data, data.size_meters, data.pose)
         return data.data
     
     @staticmethod
     def decode(data: bytearray) -> "SLAMMap":
+        if mapfile.is_mapfile(data):
+            file = mapfile.MapFile(data)
+            map = SLAMMap(None, True, file.size_meters, file.pose)
+            map.file = file
+            return map
         return SLAMMap(data)
     
     def to_numpy(self, mapsize: int) -> np.ndarray:
         return np.frombuffer(self.data, dtype=np.uint8).reshape((mapsize, mapsize))
 
+    def region(self, rows: slice, cols: slice) -> np.ndarray:
+        """Part of the map, decompressing only the chunks it overlaps"""
+        if self._data is None and self.file is not None:
+            return self.file.read((rows, cols))
+
+        mapsize = int(np.sqrt(len(self.data)))
+        return self.to_numpy(mapsize)[rows, cols]
+
+class SLAMMapDelta(Datatype):
+    """
+    Tiles of the SLAM map changed since the previous sequence number
+
+    A keyframe carries every tile, so subscribers can (re)start from it; other
+    messages only apply on top of the message with the previous sequence number.
+
+    :param seq: sequence number, increments by one per message
+    :param keyframe: whether the message carries the whole map
+    :param tile: tile side, px (edge tiles are cropped to the map)
+    :param size: map side, px
+    :param tiles: list of (tile row, tile col, tile bytes)
+    """
+
+    HEADER = struct.Struct("<IBHII") # seq, keyframe, tile, size, tile count
+    TILE = struct.Struct("<HH") # tile row, tile col
+
+    def __init__(self, seq: int, keyframe: bool, tile: int, size: int, tiles: list[tuple[int, int, bytes]]):
+        super().__init__()
+        self.seq = seq
+        self.keyframe = keyframe
+        self.tile = tile
+        self.size = size
+        self.tiles = tiles
+
+    @staticmethod
+    def encode(data: "SLAMMapDelta"):
+        parts = [SLAMMapDelta.HEADER.pack(data.seq, data.keyframe, data.tile, data.size, len(data.tiles))]
+        for row, col, pixels in data.tiles:
+            parts.append(SLAMMapDelta.TILE.pack(row, col))
+            parts.append(pixels)
+        return b"".join(parts)
+
+    @staticmethod
+    def decode(data: bytearray) -> "SLAMMapDelta":
+        view = memoryview(data)
+        seq, keyframe, tile, size, count = SLAMMapDelta.HEADER.unpack_from(view)
+        offset = SLAMMapDelta.HEADER.size
+
+        tiles = []
+        for _ in range(count):
+            row, col = SLAMMapDelta.TILE.unpack_from(view, offset)
+            offset += SLAMMapDelta.TILE.size
+
+            length = min(tile, size - row * tile) * min(tile, size - col * tile)
+            tiles.append((row, col, view[offset:offset + length]))
+            offset += length
+
+        return SLAMMapDelta(seq, bool(keyframe), tile, size, tiles)
+
+    def regions(self):
+        """Yields (rows, cols, tile array) for every tile, tile arrays are views of the message"""
+
+        for row, col, pixels in self.tiles:
+            rows = slice(row * self.tile, min((row + 1) * self.tile, self.size))
+            cols = slice(col * self.tile, min((col + 1) * self.tile, self.size))
+            yield rows, cols, np.frombuffer(pixels, dtype=np.uint8).reshape((rows.stop - rows.start, cols.stop - cols.start))
+
 class SLAMPosition(Movement):
     @staticmethod
     def decode(data, decoders = { 0: Vector }):
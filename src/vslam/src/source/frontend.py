@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class ScanDecimator:
+    """
+    Picks the lidar scans worth a SLAM update
+
+    Scans taken while the robot stands still repeat what the map already holds,
+    so only one of them every `keep_interval` seconds is used. The robot counts
+    as standing still when ranges barely differ from the last used scan and,
+    if there is odometry, it reports less motion than the thresholds since that
+    scan; changed ranges always count as moving, whatever odometry says.
+    Odometry of skipped scans is merged into the next used one, including
+    across scans that came without odometry.
+
+    :param min_translation_mm: travel since the last used scan that counts as moving
+    :param min_rotation_deg: rotation since the last used scan that counts as moving
+    :param max_range_change_mm: median range change still counting as the same view
+    :param keep_interval: seconds between used scans while standing still
+    """
+
+    MIN_COMMON_BEAMS = 30 # fewer beams seen in both scans can't tell the robot didn't move
+
+    def __init__(self, min_translation_mm: float = 20, min_rotation_deg: float = 2,
+                 max_range_change_mm: float = 30, keep_interval: float = 1.0):
+        self.min_translation_mm = min_translation_mm
+        self.min_rotation_deg = min_rotation_deg
+        self.max_range_change_mm = max_range_change_mm
+        self.keep_interval = keep_interval
+
+        self.reference = None # ranges of the last used scan by whole degree, 0 where there was no return
+        self.last_time = None
+        self.pending = None # (dxy mm, dtheta deg, dt s) of skipped scans
+
+        self.used = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _bin(distances: np.ndarray, angles: np.ndarray) -> np.ndarray:
+        ranges = np.zeros(360, dtype=np.float32)
+        ranges[np.round(angles).astype(np.int64) % 360] = distances
+        return ranges
+
+    def _stationary(self, ranges: np.ndarray, pose_change) -> bool:
+        if pose_change is not None:
+            dxy_mm, dtheta_deg, _ = pose_change
+            if abs(dxy_mm) >= self.min_translation_mm or abs(dtheta_deg) >= self.min_rotation_deg:
+                return False
+
+        # odometry may be missing or wrong (e.g. speeds not commanded by vmovement), ranges have the last word
+        common = (ranges > 0) & (self.reference > 0)
+        if np.count_nonzero(common) < self.MIN_COMMON_BEAMS:
+            return pose_change is not None
+
+        return np.median(np.abs(ranges[common] - self.reference[common])) < self.max_range_change_mm
+
+    def accept(self, now: float, distances: np.ndarray, angles: np.ndarray, pose_change=None) -> tuple[bool, tuple | None]:
+        """
+        Decides whether the scan is used
+
+        Returns (use scan, pose change to update with); the pose change includes
+        the odometry of scans skipped since the last used one, None without odometry
+        (the blind match of a used scan then also covers the pending odometry)
+        """
+        if pose_change is not None and self.pending is not None:
+            pose_change = tuple(a + b for a, b in zip(self.pending, pose_change))
+
+        ranges = self._bin(distances, angles)
+
+        if self.reference is not None and now - self.last_time < self.keep_interval and self._stationary(ranges, pose_change):
+            if pose_change is not None:
+                self.pending = pose_change
+            self.skipped += 1
+            return False, None
+
+        self.reference = ranges
+        self.last_time = now
+        self.pending = None
+        self.used += 1
+        return True, pose_change
@@ -0,0 +1,106 @@
+import numpy as np
+from miniros_vslam.source.datatypes import SLAMMapDelta
+
+
+class MapDeltaEncoder:
+    """
+    Turns successive full maps into `SLAMMapDelta` messages
+
+    Keeps a snapshot of what subscribers have seen and sends only tiles that differ
+    from it, with a keyframe every `keyframe_interval` messages.
+
+    :param size: map side, px
+    :param tile: tile side, px
+    :param keyframe_interval: messages between keyframes
+    """
+
+    def __init__(self, size: int, tile: int = 64, keyframe_interval: int = 20):
+        self.size = size
+        self.tile = tile
+        self.keyframe_interval = keyframe_interval
+
+        self.seq = 0
+        self.sent = None
+
+    def encode(self, map, changed: tuple[slice, slice] | None = None) -> SLAMMapDelta:
+        """
+        Delta of map (bytes-like or array of size x size) against the previously encoded one
+
+        :param changed: (rows, cols) slices outside of which map is known to be unchanged, None to compare everything
+        """
+
+        current = np.frombuffer(map, dtype=np.uint8).reshape((self.size, self.size))
+        keyframe = self.sent is None or self.seq % self.keyframe_interval == 0
+
+        tiles_count = -(-self.size // self.tile)
+        if keyframe:
+            if self.sent is None:
+                self.sent = np.empty_like(current)
+            dirty = np.ones((tiles_count, tiles_count), dtype=bool)
+        else:
+            dirty = np.zeros((tiles_count, tiles_count), dtype=bool)
+            if changed is None:
+                changed = (slice(0, self.size), slice(0, self.size))
+
+            # compare whole tiles covering the changed region
+            rows, cols = changed
+            r0, c0 = rows.start // self.tile, cols.start // self.tile
+            r1, c1 = -(-rows.stop // self.tile), -(-cols.stop // self.tile)
+
+            if r1 > r0 and c1 > c0:
+                window = (slice(r0 * self.tile, r1 * self.tile), slice(c0 * self.tile, c1 * self.tile))
+                diff = current[window] != self.sent[window]
+                rstarts = np.arange(0, diff.shape[0], self.tile)
+                cstarts = np.arange(0, diff.shape[1], self.tile)
+                dirty[r0:r1, c0:c1] = np.logical_or.reduceat(np.logical_or.reduceat(diff, rstarts, axis=0), cstarts, axis=1)
+
+        tiles = []
+        for row, col in np.argwhere(dirty):
+            rows = slice(row * self.tile, (row + 1) * self.tile)
+            cols = slice(col * self.tile, (col + 1) * self.tile)
+
+            pixels = current[rows, cols]
+            self.sent[rows, cols] = pixels
+            tiles.append((int(row), int(col), pixels.tobytes()))
+
+        delta = SLAMMapDelta(self.seq, keyframe, self.tile, self.size, tiles)
+        self.seq += 1
+        return delta
+
+
+class MapAssembler:
+    """
+    Rebuilds the full map from a keyframe and the deltas following it
+
+    When a delta is missing (sequence gap) deltas are ignored until the next keyframe.
+    """
+
+    def __init__(self):
+        self.map = None
+        self.seq = None
+
+    def synced(self) -> bool:
+        return self.seq is not None
+
+    def apply(self, delta: SLAMMapDelta) -> list[tuple[slice, slice]] | None:
+        """
+        Applies delta to the map
+
+        Returns regions whose pixels actually changed, None if delta could not be applied
+        """
+
+        if delta.keyframe:
+            if self.map is None or self.map.shape != (delta.size, delta.size):
+                self.map = np.zeros((delta.size, delta.size), dtype=np.uint8)
+        elif self.seq is None or delta.seq != self.seq + 1:
+            self.seq = None
+            return None
+
+        changed = []
+        for rows, cols, pixels in delta.regions():
+            if not np.array_equal(self.map[rows, cols], pixels):
+                self.map[rows, cols] = pixels
+                changed.append((rows, cols))
+
+        self.seq = delta.seq
+        return changed
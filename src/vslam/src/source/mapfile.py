@@ -0,0 +1,149 @@
+import math
+import struct
+import zlib
+import numpy as np
+
+
+MAGIC = b"VMAP"
+VERSION = 1
+
+# magic, version, map size px, map size m, chunk side px, pose x mm, y mm, theta deg
+HEADER = struct.Struct("<4sBIdIddd")
+# compressed length, crc32 of the raw chunk
+CHUNK = struct.Struct("<II")
+
+
+def is_mapfile(data) -> bool:
+    return bytes(memoryview(data)[:len(MAGIC)]) == MAGIC
+
+
+def encode_map(map, size_meters: float, pose=(0, 0, 0), chunk: int = 256, level: int = 1) -> bytes:
+    """
+    Packs a square uint8 map into the chunked container
+
+    Every chunk x chunk square is zlib compressed separately and checksummed, so
+    readers can decompress only the part of the map they need.
+
+    :param map: square map array or bytes-like of size_px ** 2 bytes
+    :param size_meters: map side, m
+    :param pose: robot pose (x mm, y mm, theta degrees)
+    :param chunk: chunk side, px
+    :param level: zlib compression level
+    """
+    if not isinstance(map, np.ndarray):
+        map = np.frombuffer(map, dtype=np.uint8)
+    if map.ndim == 1:
+        size = math.isqrt(len(map))
+        map = map.reshape((size, size))
+    size = map.shape[0]
+
+    table = []
+    chunks = []
+    for r in range(0, size, chunk):
+        for c in range(0, size, chunk):
+            raw = np.ascontiguousarray(map[r:r + chunk, c:c + chunk])
+            compressed = zlib.compress(raw, level)
+            table.append(CHUNK.pack(len(compressed), zlib.crc32(raw)))
+            chunks.append(compressed)
+
+    header = HEADER.pack(MAGIC, VERSION, size, size_meters, chunk, *pose)
+    return b"".join([header] + table + chunks)
+
+
+class MapFile:
+    """
+    Reader of the chunked map container
+
+    Only the header and chunk table are parsed on construction; chunks are
+    decompressed and checked on `read`.
+
+    :param data: bytes-like container
+    """
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+
+        magic, version, self.size_pixels, self.size_meters, self.chunk, *pose = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError("Not a map file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported map file version {version}")
+        self.pose = tuple(pose)
+
+        self.chunks_side = -(-self.size_pixels // self.chunk)
+        count = self.chunks_side ** 2
+
+        table = np.frombuffer(self.data, dtype="<u4", count=count * 2, offset=HEADER.size).reshape((count, 2))
+        self.lengths = table[:, 0].astype(np.int64)
+        self.crcs = table[:, 1]
+        self.offsets = HEADER.size + CHUNK.size * count + np.concatenate(([0], np.cumsum(self.lengths)[:-1]))
+
+    def read_chunk(self, row: int, col: int) -> np.ndarray:
+        """Decompresses a single chunk, raises ValueError if its checksum does not match"""
+
+        index = row * self.chunks_side + col
+        offset = int(self.offsets[index])
+        try:
+            raw = zlib.decompress(self.data[offset:offset + int(self.lengths[index])])
+        except zlib.error as e:
+            raise ValueError(f"Map chunk {row}, {col} is corrupted: {e}")
+
+        if zlib.crc32(raw) != self.crcs[index]:
+            raise ValueError(f"Map chunk {row}, {col} is corrupted")
+
+        rows = min(self.chunk, self.size_pixels - row * self.chunk)
+        cols = min(self.chunk, self.size_pixels - col * self.chunk)
+        return np.frombuffer(raw, dtype=np.uint8).reshape((rows, cols))
+
+    def read(self, region: tuple[slice, slice] | None = None, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Decodes the map or a (rows, cols) region of it, decompressing only overlapping chunks
+
+        :param out: array of the region shape to decode into
+        """
+        if region is None:
+            region = (slice(0, self.size_pixels), slice(0, self.size_pixels))
+        rows, cols = (slice(*s.indices(self.size_pixels)[:2]) for s in region)
+
+        if out is None:
+            out = np.empty((rows.stop - rows.start, cols.stop - cols.start), dtype=np.uint8)
+
+        for row in range(rows.start // self.chunk, -(-rows.stop // self.chunk)):
+            for col in range(cols.start // self.chunk, -(-cols.stop // self.chunk)):
+                r0, c0 = row * self.chunk, col * self.chunk
+                r1, c1 = max(r0, rows.start), max(c0, cols.start)
+                r2, c2 = min(r0 + self.chunk, rows.stop), min(c0 + self.chunk, cols.stop)
+
+                out[r1 - rows.start:r2 - rows.start, c1 - cols.start:c2 - cols.start] = \
+                    self.read_chunk(row, col)[r1 - r0:r2 - r0, c1 - c0:c2 - c0]
+
+        return out
+
+
+def save(path: str, map, size_meters: float, pose=(0, 0, 0), chunk: int = 256):
+    with open(path, "wb") as f:
+        f.write(encode_map(map, size_meters, pose, chunk))
+
+
+def load(path: str, size_pixels: int) -> tuple[bytearray, tuple | None]:
+    """
+    Reads a saved map, returns (map bytes, pose or None)
+
+    Legacy raw `.map` files of size_pixels ** 2 bytes are accepted too, raises
+    ValueError if the file does not fit the map size.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not is_mapfile(data):
+        if len(data) != size_pixels ** 2:
+            raise ValueError(f"Raw map file has {len(data)} bytes, expected {size_pixels ** 2}")
+        return bytearray(data), None
+
+    file = MapFile(data)
+    if file.size_pixels != size_pixels:
+        raise ValueError(f"Map file is {file.size_pixels} px, expected {size_pixels}")
+
+    map = bytearray(size_pixels ** 2)
+    file.read(out=np.frombuffer(map, dtype=np.uint8).reshape((size_pixels, size_pixels)))
+    return map, file.pose
@@ -0,0 +1,132 @@
+import mmap
+import os
+import shutil
+import struct
+import time
+from contextlib import contextmanager
+import numpy as np
+
+
+MAGIC = b"VMMP"
+VERSION = 1
+
+# magic, version, map size px, reserved, write sequence, pose x mm, y mm, theta deg
+HEADER = struct.Struct("<4sIIIQddd")
+OFFSET = 64 # map pixels start, leaves room for the header to grow
+
+UNKNOWN = 127 # value of unexplored pixels in maps from CoreSLAM.getmap
+
+SNAPSHOT_RETRIES = 1000
+SNAPSHOT_WAIT = 0.001 # s between snapshot attempts while a write is in progress
+
+
+class MapStore:
+    """
+    SLAM map backed by a memory-mapped file
+
+    The writer fills `buffer` in place (e.g. `slam.getmap(store.buffer)`) inside
+    `writing()`, which also stores the pose. Other local processes open the same
+    file with `readonly=True` and read `map` zero-copy, or take a `snapshot` that
+    is guaranteed not to be torn by a concurrent write.
+
+    :param path: map file, created if missing (unless readonly)
+    :param size_pixels: map side, px; taken from the file if None
+    :param readonly: map the file for reading only
+    """
+
+    def __init__(self, path: str, size_pixels: int | None = None, readonly: bool = False):
+        self.path = path
+
+        if not os.path.exists(path):
+            if readonly or size_pixels is None:
+                raise FileNotFoundError(path)
+            self._create(path, size_pixels)
+
+        self.file = open(path, "rb" if readonly else "r+b")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+
+        magic, version, self.size_pixels, _, _, *_ = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a map store")
+        if size_pixels is not None and size_pixels != self.size_pixels:
+            self.close()
+            raise ValueError(f"{path} is {self.size_pixels} px, expected {size_pixels}")
+
+        length = self.size_pixels ** 2
+        self.buffer = memoryview(self.mmap)[OFFSET:OFFSET + length]
+        self.map = np.frombuffer(self.buffer, dtype=np.uint8).reshape((self.size_pixels, self.size_pixels))
+
+        if not readonly and self.seq % 2:
+            self._set_seq(self.seq + 1) # the previous writer died mid-write, its map is as good as it gets
+
+    @staticmethod
+    def _create(path: str, size_pixels: int):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, size_pixels, 0, 0, 0, 0, 0).ljust(OFFSET, b"\0"))
+            row = bytes([UNKNOWN]) * size_pixels
+            for _ in range(size_pixels):
+                f.write(row)
+
+    @property
+    def seq(self) -> int:
+        """Write sequence number, odd while a write is in progress"""
+        return HEADER.unpack_from(self.mmap)[4]
+
+    @property
+    def pose(self) -> tuple[float, float, float]:
+        return tuple(HEADER.unpack_from(self.mmap)[5:])
+
+    def _set_seq(self, seq: int):
+        struct.pack_into("<Q", self.mmap, 16, seq)
+
+    @contextmanager
+    def writing(self, pose=None):
+        """Marks the map as being written (seqlock), yields the pixel buffer"""
+
+        seq = self.seq
+        self._set_seq(seq + 1)
+        try:
+            yield self.buffer
+            if pose is not None:
+                struct.pack_into("<ddd", self.mmap, 24, *pose)
+        finally:
+            self._set_seq(seq + 2)
+
+    def snapshot(self, out: np.ndarray | None = None, retries: int = SNAPSHOT_RETRIES) -> tuple[np.ndarray, int, tuple]:
+        """
+        Copy of the map not torn by a concurrent write, returns (map, seq, pose)
+
+        Raises TimeoutError if no write-free copy could be taken in `retries` attempts
+        """
+
+        if out is None:
+            out = np.empty_like(self.map)
+
+        for _ in range(retries):
+            seq = self.seq
+            if not seq % 2:
+                pose = self.pose
+                np.copyto(out, self.map)
+                if self.seq == seq:
+                    return out, seq, pose
+
+            time.sleep(SNAPSHOT_WAIT)
+
+        raise TimeoutError(f"{self.path} is being written for too long")
+
+    def flush(self):
+        self.mmap.flush()
+
+    def save(self, path: str):
+        """Flushes the map and copies the file to path, which can then be opened as a MapStore"""
+
+        self.flush()
+        shutil.copyfile(self.path, path)
+
+    def close(self):
+        self.map = None
+        if getattr(self, "buffer", None) is not None:
+            self.buffer.release()
+        self.mmap.close()
+        self.file.close()
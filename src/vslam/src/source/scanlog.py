@@ -0,0 +1,107 @@
+import struct
+import numpy as np
+
+
+MAGIC = b"VSCN"
+VERSION = 1
+
+HEADER = struct.Struct("<4sB") # magic, version
+# timestamp s, point count, flags
+RECORD = struct.Struct("<dHB")
+# reference pose x mm, y mm, theta deg, present when FLAG_POSE is set
+POSE = struct.Struct("<ddd")
+
+FLAG_POSE = 1
+
+ANGLE_SCALE = 100 # angles are stored in 1/100 degree
+
+
+class ScanRecord:
+    __slots__ = ("timestamp", "distances", "angles", "pose")
+
+    def __init__(self, timestamp: float, distances: np.ndarray, angles: np.ndarray, pose: tuple | None):
+        self.timestamp = timestamp
+        self.distances = distances
+        self.angles = angles
+        self.pose = pose
+
+
+class ScanWriter:
+    """
+    Appends lidar scans to a scan log
+
+    Every record holds a timestamp, distances as uint16 mm, angles as uint16
+    1/100 degree and, optionally, a reference pose (e.g. ground truth of a
+    simulated run) to measure drift against.
+
+    :param path: log file, overwritten
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.count = 0
+
+    def write(self, timestamp: float, distances, angles, pose=None):
+        distances = np.clip(np.rint(np.asarray(distances, dtype=np.float64)), 0, 0xFFFF).astype("<u2")
+        angles = np.rint(np.mod(np.asarray(angles, dtype=np.float64), 360) * ANGLE_SCALE).astype("<u2")
+
+        self.file.write(RECORD.pack(timestamp, len(distances), FLAG_POSE if pose is not None else 0))
+        if pose is not None:
+            self.file.write(POSE.pack(*pose))
+        self.file.write(distances.tobytes())
+        self.file.write(angles.tobytes())
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_scans(path: str):
+    """
+    Yields the `ScanRecord`s of a scan log, distances and angles as float arrays
+
+    Raises ValueError if the file is not a scan log; a record cut short at the
+    end of the file (recorder killed mid-write) is dropped.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a scan log")
+
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a scan log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported scan log version {version}")
+
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        timestamp, count, flags = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+
+        pose = None
+        if flags & FLAG_POSE:
+            if offset + POSE.size > len(data):
+                return
+            pose = POSE.unpack_from(data, offset)
+            offset += POSE.size
+
+        if offset + count * 4 > len(data):
+            return
+
+        distances = np.frombuffer(data, dtype="<u2", count=count, offset=offset).astype(np.float64)
+        angles = np.frombuffer(data, dtype="<u2", count=count, offset=offset + count * 2) / ANGLE_SCALE
+        offset += count * 4
+
+        yield ScanRecord(timestamp, distances, angles, pose)